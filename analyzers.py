@@ -0,0 +1,23 @@
+from tantivy import Filter, TextAnalyzerBuilder, Tokenizer
+
+# Eigene Tokenizer fuer indexing.py (Schreiben) und die App (Suchen). tantivy speichert
+# nur den Namen im Schema; jede Index-Instanz muss sie per register() selbst kennen.
+
+# Teilwort-Suche im Titel: Trigramme ueber den ganzen Titel, auch ueber Wortgrenzen
+# ("ing ba" trifft "Breaking Bad" wie frueher `q in title.lower()`)
+NGRAM_TOKENIZER = "title_ngram"
+NGRAM_SIZE = 3
+
+
+def register(index):
+    index.register_tokenizer(
+        NGRAM_TOKENIZER,
+        TextAnalyzerBuilder(Tokenizer.ngram(NGRAM_SIZE, NGRAM_SIZE, False)).filter(Filter.lowercase()).build(),
+    )
+    return index
+
+
+def ngrams(text):
+    """Trigramme eines Suchtexts wie sie der Tokenizer erzeugt (leer, wenn der Text zu kurz ist)."""
+    text = text.lower()
+    return sorted({text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)})
@@ -0,0 +1,381 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+from tantivy import DocAddress
+
+import facets
+import similar
+import tags
+
+# --- SNAPSHOT ---
+# catalog.bin im Indexordner: Magic, Header-Laenge, JSON-Header, dann ausgerichtete Spalten.
+# indexing.py schreibt ihn nach jedem Build; die App mappt ihn read-only (mehrere Prozesse
+# teilen sich dieselben Seiten im Page-Cache).
+SNAPSHOT_NAME = "catalog.bin"
+SNAPSHOT_MAGIC = b"SERIENKT"
+SNAPSHOT_FORMAT = 5
+ALIGN = 64
+
+# Katalogspalte -> (Indexfeld, Typ, Wert bei fehlendem Feld)
+NUMERIC_COLUMNS = {
+    "id": ("id", np.int64, 0),
+    "pop": ("tmdb_popularity", np.float64, 0.0),
+    "rate": ("tmdb_vote_average", np.float64, 0.0),
+    "count": ("tmdb_vote_count", np.int64, 0),
+    "score": ("score", np.int64, 0),
+    "date": ("start", np.int64, 0),
+}
+
+
+def index_state(path):
+    """Kennung des Index-Stands (Segmente + Loeschungen aus meta.json); Trefferadressen gelten nur dafuer."""
+    with open(os.path.join(path, "meta.json"), "r") as f:
+        segments = json.load(f)["segments"]
+    return hashlib.sha1(json.dumps(segments, sort_keys=True).encode()).hexdigest()
+
+
+def address_key(segment_ord, doc):
+    """DocAddress als ein int64 (Segment in den oberen 32 Bit)."""
+    return (segment_ord << 32) | doc
+
+
+def aligned(size):
+    return -(-size // ALIGN) * ALIGN
+
+
+class Strings:
+    """Stringspalte als Offsets + UTF-8-Bytes; einzelne Werte werden erst beim Zugriff dekodiert."""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    @classmethod
+    def from_list(cls, values):
+        encoded = [v.encode("utf-8") for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        return bytes(self.data[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8")
+
+
+class FacetBitsets:
+    """Je kanonischem Genre/Anbieter ein Bitset ueber alle Serien (uint64-Woerter, Bit = Zeile).
+
+    Dienen den Startseiten-Reihen, den Genre-/Anbieterlisten in rows() und dem Filter
+    fuer Indizes ohne kanonische Facetten; die Kosten haengen von der Zahl der
+    gewaehlten Facetten ab, nicht von Texten pro Serie.
+    """
+
+    def __init__(self, names, words, rows):
+        self.names = list(names)
+        self.position = {name: i for i, name in enumerate(self.names)}
+        self.words = words.reshape(len(self.names), -1)
+        self.num_rows = rows
+
+    @classmethod
+    def from_lists(cls, names, lists):
+        names = list(names)
+        position = {name: i for i, name in enumerate(names)}
+        # Auf ganze Woerter auffuellen; packbits(little) legt Zeile r in Bit r % 64 von Wort r // 64
+        width = -(-len(lists) // 64) * 64
+        member = np.zeros((len(names), width), dtype=bool)
+        for row, values in enumerate(lists):
+            for value in values:
+                member[position[value], row] = True
+        words = np.packbits(member, axis=1, bitorder="little").view("<u8")
+        return cls(names, words, len(lists))
+
+    def bitset(self, selected):
+        """Bitset der Zeilen, die zu mindestens einem der gewaehlten Namen gehoeren."""
+        ids = [self.position[name] for name in selected if name in self.position]
+        if not ids:
+            return np.zeros(self.words.shape[1], dtype="<u8")
+        return np.bitwise_or.reduce(self.words[ids], axis=0)
+
+    def to_mask(self, bitset):
+        return np.unpackbits(bitset.view(np.uint8), bitorder="little")[:self.num_rows].astype(bool)
+
+    def mask(self, selected):
+        """Zeilen, die zu mindestens einem der Namen gehoeren."""
+        return self.to_mask(self.bitset(selected))
+
+    def values(self, row):
+        word, bit = divmod(int(row), 64)
+        column = self.words[:, word]
+        return [name for i, name in enumerate(self.names) if int(column[i]) >> bit & 1]
+
+
+class SortedLookup:
+    """Schluessel -> Zeile per Binaersuche (statt eines Python-Dicts ueber alle Serien)."""
+
+    def __init__(self, column):
+        self.order = np.argsort(column, kind="stable")
+        self.sorted = column[self.order]
+
+    def rows(self, keys):
+        """Zeile je Schluessel, -1 fuer unbekannte."""
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(self.sorted) == 0:
+            return np.full(len(keys), -1)
+        pos = np.minimum(np.searchsorted(self.sorted, keys), len(self.sorted) - 1)
+        return np.where(self.sorted[pos] == keys, self.order[pos], -1)
+
+
+class Catalog:
+    """Alle Serien spaltenweise (NumPy): Anzeige-Daten, Startseiten-Reihen (Top-k) und Ersatz-Filter als Masken."""
+
+    def __init__(self, columns, flags, title, poster, actors, genres, providers, rails=None, neighbors=None,
+                 mapped=None):
+        for name in NUMERIC_COLUMNS:
+            setattr(self, name, columns[name])
+        # DocAddress der Serie im Index-Stand, fuer den der Katalog gebaut wurde
+        self.address = columns["address"]
+        self.flags = flags
+        self.title = title
+        self.poster = poster
+        # Cast je Serie, Namen durch "\n" getrennt (fuer die Suchvorschlaege)
+        self.actors = actors
+        self.genres = genres
+        self.providers = providers
+        # Offenes mmap des Snapshots; die Spalten sind Sichten darauf
+        self.mapped = mapped
+        self.by_address = SortedLookup(self.address)
+        self.by_id = SortedLookup(self.id)
+        # Startseiten-Reihen: Kategorie -> Zeilennummern (einmal pro Index-Stand berechnet)
+        self.rails = rails if rails is not None else self.compute_rails()
+        # "Aehnliche Serien": Zeilen x SIMILAR_K Nachbarzeilen (-1 = keiner); nur wenn beim Indexieren berechnet
+        self.neighbors = neighbors
+
+    @classmethod
+    def from_index(cls, index, searcher=None, neighbors=False):
+        """Laedt den ganzen Index (ohne Limit), Duplikate anhand des Titels entfernt.
+
+        neighbors=True berechnet zusaetzlich die aehnlichen Serien (TF-IDF, nur beim Indexieren).
+        """
+        searcher = searcher or index.searcher()
+        hits = searcher.search(index.parse_query("*", ["title"]), max(searcher.num_docs, 1)).hits
+        docs = []
+        addresses = []
+        seen_titles = set()
+        for _, addr in hits:
+            doc = searcher.doc(addr)
+            title_lower = doc["title"][0].strip().lower()
+            if title_lower in seen_titles:
+                continue
+            seen_titles.add(title_lower)
+            docs.append(doc)
+            addresses.append(address_key(addr.segment_ord, addr.doc))
+
+        n = len(docs)
+        first = lambda d, field, default: d[field][0] if d[field] else default
+        columns = {
+            name: np.fromiter((first(d, field, default) for d in docs), dtype=dtype, count=n)
+            for name, (field, dtype, default) in NUMERIC_COLUMNS.items()
+        }
+        columns["address"] = np.array(addresses, dtype=np.int64)
+        flags = {
+            field: np.fromiter((first(d, field, 0) for d in docs), dtype=np.int8, count=n)
+            for field in tags.TAGS
+        }
+        similar_rows = None
+        if neighbors:
+            similar_rows = similar.neighbors(*similar.tfidf([
+                similar.features(first(d, "description", ""), first(d, "tmdb_overview", ""), d["genres"], d["actors"])
+                for d in docs
+            ]))
+        return cls(
+            columns, flags,
+            Strings.from_list([d["title"][0] for d in docs]),
+            Strings.from_list([first(d, "tmdb_poster_path", "") for d in docs]),
+            Strings.from_list(["\n".join(d["actors"]) for d in docs]),
+            FacetBitsets.from_lists(facets.GENRE_SYNONYME, [facets.canonical_genres(d["genres"]) for d in docs]),
+            FacetBitsets.from_lists(facets.FILTER_PROVIDERS,
+                                    [facets.canonical_providers(d["providers"]) for d in docs]),
+            neighbors=similar_rows,
+        )
+
+    def compute_rails(self, categories=facets.HOMEPAGE_KATEGORIEN, k=facets.RAIL_SIZE):
+        key = np.where(self.count >= facets.RAIL_MIN_VOTES, self.rate, 0.0)
+        return {name: self.top(self.genres.mask([name]), key, k=k) for name in categories}
+
+    def arrays(self):
+        """Alle Spalten als flache Arrays (Reihenfolge = Layout im Snapshot)."""
+        arrays = {name: getattr(self, name) for name in NUMERIC_COLUMNS}
+        arrays["address"] = self.address
+        for field, values in self.flags.items():
+            arrays[f"flag:{field}"] = values
+        for name, strings in (("title", self.title), ("poster", self.poster), ("actors", self.actors)):
+            arrays[f"{name}:offsets"] = strings.offsets
+            arrays[f"{name}:data"] = strings.data
+        arrays["genres"] = self.genres.words.ravel()
+        arrays["providers"] = self.providers.words.ravel()
+        arrays["rails"] = np.concatenate([np.zeros(0, np.int64)] + list(self.rails.values())).astype(np.int64)
+        if self.neighbors is not None:
+            arrays["neighbors"] = self.neighbors.ravel()
+        return arrays
+
+    def save(self, path, state):
+        """Schreibt den Snapshot atomar (tmp + os.replace) fuer den Index-Stand `state`."""
+        arrays = self.arrays()
+        header = {
+            "format": SNAPSHOT_FORMAT, "state": state, "rows": len(self),
+            "flags": list(self.flags), "genres": self.genres.names, "providers": self.providers.names,
+            "rails": {name: len(rows) for name, rows in self.rails.items()},
+            "neighbors": self.neighbors.shape[1] if self.neighbors is not None else 0,
+            "columns": {},
+        }
+        # Offsets relativ zum Datenbereich, damit sie nicht von der Header-Laenge abhaengen
+        offset = 0
+        for name, values in arrays.items():
+            header["columns"][name] = {"dtype": values.dtype.str, "offset": offset, "length": len(values)}
+            offset += aligned(values.nbytes)
+        encoded = json.dumps(header).encode("utf-8")
+        start = aligned(len(SNAPSHOT_MAGIC) + 8 + len(encoded))
+
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(SNAPSHOT_MAGIC + struct.pack("<Q", len(encoded)) + encoded)
+            for name, values in arrays.items():
+                f.seek(start + header["columns"][name]["offset"])
+                f.write(np.ascontiguousarray(values).tobytes())
+            f.truncate(start + offset)
+        os.replace(tmp, path)
+
+    @classmethod
+    def open(cls, path, state):
+        """Snapshot read-only mappen; None, wenn er fehlt oder nicht zum Index-Stand passt."""
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        prefix = len(SNAPSHOT_MAGIC) + 8
+        header = None
+        if mapped[:len(SNAPSHOT_MAGIC)] == SNAPSHOT_MAGIC:
+            (size,) = struct.unpack("<Q", mapped[len(SNAPSHOT_MAGIC):prefix])
+            header = json.loads(mapped[prefix:prefix + size])
+        if header is None or header["format"] != SNAPSHOT_FORMAT or header["state"] != state:
+            mapped.close()
+            return None
+
+        start = aligned(prefix + size)
+        arrays = {
+            name: np.frombuffer(mapped, dtype=np.dtype(col["dtype"]), count=col["length"],
+                                offset=start + col["offset"])
+            for name, col in header["columns"].items()
+        }
+        rails = {}
+        position = 0
+        for name, length in header["rails"].items():
+            rails[name] = arrays["rails"][position:position + length]
+            position += length
+        return cls(
+            arrays,
+            {field: arrays[f"flag:{field}"] for field in header["flags"]},
+            Strings(arrays["title:offsets"], arrays["title:data"]),
+            Strings(arrays["poster:offsets"], arrays["poster:data"]),
+            Strings(arrays["actors:offsets"], arrays["actors:data"]),
+            FacetBitsets(header["genres"], arrays["genres"], header["rows"]),
+            FacetBitsets(header["providers"], arrays["providers"], header["rows"]),
+            rails=rails,
+            neighbors=arrays["neighbors"].reshape(header["rows"], header["neighbors"]) if header["neighbors"] else None,
+            mapped=mapped,
+        )
+
+    def __len__(self):
+        return len(self.id)
+
+    def filter(self, genres=None, providers=None):
+        """Boolesche Maske ueber alle Serien; genres/providers: kanonische Namen (ODER, dazwischen UND).
+
+        Fuer Indizes ohne kanonische Facetten (siehe query_builder.filter_clauses).
+        """
+        if genres or providers:
+            # Erst auf den Bitsets verknuepfen, dann einmal in eine Maske entpacken
+            words = np.full(self.genres.words.shape[1], np.iinfo(np.uint64).max, dtype="<u8")
+            if genres:
+                words &= self.genres.bitset(genres)
+            if providers:
+                words &= self.providers.bitset(providers)
+            return self.genres.to_mask(words)
+        return np.ones(len(self), dtype=bool)
+
+    def top(self, mask, key, k=None):
+        """Zeilennummern der Treffer nach key absteigend; bei Gleichstand gilt die Katalogreihenfolge."""
+        rows = np.flatnonzero(mask)
+        key = key[rows]
+        if k is not None and k < len(rows):
+            # argpartition findet den k-ten Wert; nur Kandidaten darueber (inkl. Gleichstaende) sortieren
+            kth = np.argpartition(-key, k - 1)[k - 1]
+            candidates = np.flatnonzero(key >= key[kth])
+            rows, key = rows[candidates], key[candidates]
+        order = np.lexsort((rows, -key))
+        return rows[order[:k]]
+
+    def rows(self, indices):
+        """Zeilen als Dicts (wie frueher get_all_series) fuer die Darstellung."""
+        result = []
+        for i in indices:
+            row = {
+                "id": int(self.id[i]),
+                "title": self.title[i],
+                "poster": self.poster[i],
+                "genres": self.genres.values(i),
+                "providers": self.providers.values(i),
+                "pop": float(self.pop[i]),
+                "rate": float(self.rate[i]),
+                "count": int(self.count[i]),
+                "score": int(self.score[i]),
+                "date": int(self.date[i]),
+            }
+            for field, values in self.flags.items():
+                row[field] = int(values[i])
+            result.append(row)
+        return result
+
+    def hit_rows(self, hits):
+        return self.by_address.rows([address_key(addr.segment_ord, addr.doc) for _, addr in hits])
+
+    def unique_hits(self, hits):
+        """Nur Treffer, die im Katalog stehen (Titel-Duplikate fallen weg)."""
+        return [hit for hit, row in zip(hits, self.hit_rows(hits)) if row >= 0]
+
+    def rows_for_hits(self, hits):
+        """Zeilennummern zu tantivy-Treffern in Trefferreihenfolge; Titel-Duplikate fallen weg."""
+        return [int(row) for row in self.hit_rows(hits) if row >= 0]
+
+    def doc_address(self, series_id):
+        """DocAddress zu einer Serien-ID ohne Suche; None, wenn die ID nicht im Katalog steht."""
+        row = self.by_id.rows([series_id])[0]
+        if row < 0:
+            return None
+        key = int(self.address[row])
+        return DocAddress(key >> 32, key & 0xFFFFFFFF)
+
+    def similar(self, row):
+        """Zeilen der aehnlichsten Serien, vorberechnet beim Indexieren (leer ohne Nachbarliste)."""
+        if self.neighbors is None:
+            return []
+        return [int(r) for r in self.neighbors[row] if r >= 0]
+
+    def canonical_row(self, series_id, title):
+        """Katalogzeile einer Serie; ein Titel-Duplikat (nicht im Katalog) zaehlt als die Serie gleichen Titels."""
+        row = int(self.by_id.rows([series_id])[0])
+        if row >= 0:
+            return row
+        # Selten (nur ueber eine Detail-URL erreichbar), daher ohne eigenen Titel-Index
+        title = title.strip().lower()
+        return next((r for r in range(len(self)) if self.title[r].strip().lower() == title), -1)
+
+    def by_ids(self, ids):
+        """Zeilennummern zu Serien-IDs in der Reihenfolge der IDs; unbekannte IDs fallen weg."""
+        return [int(row) for row in self.by_id.rows(list(ids)) if row >= 0]
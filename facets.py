@@ -0,0 +1,142 @@
+from functools import lru_cache
+
+from tantivy import Facet
+
+# Gemeinsame Definitionen fuer indexing.py und die App. Kanonische Genres und Anbieter
+# werden beim Indexieren aufgeloest (facet_genres, facet_providers), damit die App
+# direkt per Facette filtern kann statt per Teilstring in Python.
+
+# Bewertung zaehlt fuer "Top Rated" erst ab so vielen Stimmen (Feld rating_rank)
+TOP_RATED_MIN_VOTES = 50
+
+# --- GENRE-SYNONYME ---
+GENRE_SYNONYME = {
+    "Action & Abenteuer": ["action", "abenteuer", "adventure", "action & adventure"],
+    "Sitcom": ["sitcom", "comedy", "komödie"],
+    "Animation": ["animation", "zeichentrick", "anime", "animiert", "animated", "cartoon"],
+    "Dokumentation": ["dokumentation", "documentary", "doku"],
+    "Drama": ["drama"],
+    "Fantasy": ["fantasy", "sci-fi & fantasy"],
+    "Historisch": ["historisch", "history", "krieg", "war", "historical"],
+    "Horror": ["horror"],
+    "Komödie": ["komödie", "comedy", "komoedie"],
+    "Krimi": ["krimi", "crime", "police", "detective"],
+    "Mystery": ["mystery", "mysterie"],
+    "Romantik": ["romantik", "romance", "romantic"],
+    "Science-Fiction": ["science-fiction", "sci-fi", "science fiction", "sci fi"],
+    "Stand-Up": ["stand-up", "talk"],
+    "Thriller": ["thriller", "suspense"],
+}
+
+# Feste Genre-Liste für den Filter (nur diese!)
+FILTER_GENRES = [
+    "Action & Abenteuer",
+    "Animation",
+    "Dokumentation",
+    "Drama",
+    "Fantasy",
+    "Historisch",
+    "Horror",
+    "Komödie",
+    "Krimi",
+    "Mystery",
+    "Romantik",
+    "Science-Fiction",
+    "Sitcom",
+    "Stand-Up",
+    "Thriller",
+]
+
+# Feste Plattform-Liste für den Filter (nur diese!)
+FILTER_PROVIDERS = [
+    "Amazon Prime",
+    "Disney+",
+    "HBO Max",
+    "Joyn",
+    "Netflix",
+    "RTL+",
+]
+
+# Mapping: TMDB Provider-Namen auf unsere einheitlichen Namen
+PROVIDER_NAME_MAP = {
+    "Netflix": "Netflix",
+    "Netflix basic with Ads": "Netflix",
+    "Amazon Prime Video": "Amazon Prime",
+    "Amazon Video": "Amazon Prime",
+    "Disney Plus": "Disney+",
+    "Disney+": "Disney+",
+    "Paramount Plus": "Paramount+",
+    "Paramount+ Amazon Channel": "Paramount+",
+    "Paramount Plus Apple TV Channel": "Paramount+",
+    "HBO Max": "HBO Max",
+    "Max": "HBO Max",
+    "Max Amazon Channel": "HBO Max",
+    "Apple TV Plus": "Apple TV+",
+    "Apple TV+": "Apple TV+",
+    "WOW": "WOW",
+    "Sky Go": "WOW",
+    "Sky Ticket": "WOW",
+    "Joyn": "Joyn",
+    "Joyn Plus": "Joyn",
+    "RTL+": "RTL+",
+    "RTL Plus": "RTL+",
+    "Amazon Freevee": "Amazon Freevee",
+    "Freevee": "Amazon Freevee",
+    "Crunchyroll": "Crunchyroll",
+    "MagentaTV": "MagentaTV",
+    "ARD Mediathek": "ARD Mediathek",
+    "ZDF": "ZDF Mediathek",
+    "ZDF Mediathek": "ZDF Mediathek",
+    "Hulu": "Hulu",
+}
+
+# Vereinheitlichte Anbieter, die unter einem Filtereintrag zusammengefasst werden
+# (exakter Vergleich; alle anderen Filtereinträge stehen nur für sich selbst)
+PROVIDER_ALIASES = {
+    "Amazon Prime": ["Amazon Prime", "Amazon Freevee", "Paramount+", "Apple TV+"],
+}
+
+
+# Kategorien für die Startseite (Reihenfolge wie angezeigt)
+HOMEPAGE_KATEGORIEN = [
+    "Action & Abenteuer",
+    "Drama",
+    "Komödie",
+    "Krimi",
+    "Science-Fiction",
+    "Fantasy",
+    "Horror",
+    "Mystery",
+    "Dokumentation",
+    "Historisch",
+    "Animation",
+    "Romantik",
+    "Thriller",
+    "Sitcom",
+]
+# Je Kategorie die besten Serien nach Bewertung; die zaehlt hier schon ab 5 Stimmen
+RAIL_SIZE = 15
+RAIL_MIN_VOTES = 5
+
+
+@lru_cache(maxsize=None)
+def genres_of(value):
+    """Kanonische Genres zu einem Rohwert (Wikidata/TMDB), einmal pro Wert berechnet."""
+    value = value.lower()
+    return frozenset(name for name, needles in GENRE_SYNONYME.items() if any(n in value for n in needles))
+
+
+def canonical_genres(genres):
+    found = set().union(*(genres_of(g) for g in genres))
+    return [name for name in GENRE_SYNONYME if name in found]
+
+
+def canonical_providers(providers):
+    """Filter-Anbieter einer Serie aus ihren vereinheitlichten Anbieternamen."""
+    present = set(providers)
+    return [name for name in FILTER_PROVIDERS if present.intersection(PROVIDER_ALIASES.get(name, [name]))]
+
+
+def facet(name):
+    """Facette fuer einen kanonischen Namen ("/" ist in tantivy der Pfadtrenner)."""
+    return Facet.from_string(f"/{name.replace('/', ' ')}")
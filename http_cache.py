@@ -0,0 +1,137 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse, parse_qsl, urlencode
+
+DAY = 24 * 3600
+
+# TTL pro Endpunkt: erster passender Regex (auf den normalisierten Schluessel) gewinnt.
+# Streaming-Angebote aendern sich oft, Credits und Beschreibungen kaum.
+DEFAULT_TTLS = [
+    (r"/watch/providers|append_to_response=[^&]*watch", 1 * DAY),
+    (r"api\.themoviedb\.org/3/(find|search)/", 30 * DAY),
+    (r"api\.themoviedb\.org/3/tv/\d+/(credits|videos)", 90 * DAY),
+    (r"api\.themoviedb\.org/3/tv/\d+\?", 30 * DAY),
+    (r"wikipedia\.org/", 30 * DAY),
+]
+DEFAULT_TTL = 7 * DAY
+
+# Parameter, die nichts am Inhalt aendern und nicht in den Schluessel gehoeren
+IGNORED_PARAMS = {"api_key"}
+
+
+class CacheMiss(Exception):
+    """Im Offline-Modus gibt es fuer diese Anfrage keinen Cache-Eintrag."""
+
+
+class CachedResponse:
+    """Minimaler Ersatz fuer requests.Response (status_code, text, json())."""
+
+    def __init__(self, status_code, body, from_cache=True):
+        self.status_code = status_code
+        self.content = body
+        self.from_cache = from_cache
+        self.headers = {}
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ResponseCache:
+    """Persistenter HTTP-Cache in SQLite mit TTL pro Endpunkt und LRU-Verdraengung nach Groesse."""
+
+    def __init__(self, path="http_cache.sqlite", max_bytes=512 * 1024 * 1024,
+                 ttls=DEFAULT_TTLS, default_ttl=DEFAULT_TTL):
+        self.max_bytes = max_bytes
+        self.ttls = [(re.compile(p), ttl) for p, ttl in ttls]
+        self.default_ttl = default_ttl
+        self.lock = threading.Lock()
+        self.puts_since_evict = 0
+        self.hits = 0
+        self.misses = 0
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                status INTEGER NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires REAL NOT NULL,
+                last_access REAL NOT NULL
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_access)")
+        self.db.commit()
+
+    @staticmethod
+    def make_key(url, params=None):
+        """Normalisierte URL: Host klein, Parameter (inkl. Query-String) sortiert."""
+        parts = urlparse(url)
+        query = parse_qsl(parts.query, keep_blank_values=True)
+        if params:
+            query += [(k, str(v)) for k, v in params.items()]
+        query = sorted((k, v) for k, v in query if k not in IGNORED_PARAMS)
+        path = parts.path.rstrip("/") or "/"
+        return f"{parts.netloc.lower()}{path}?{urlencode(query)}"
+
+    def ttl_for(self, key):
+        for pattern, ttl in self.ttls:
+            if pattern.search(key):
+                return ttl
+        return self.default_ttl
+
+    def get(self, key, allow_stale=False):
+        """Liefert (status, body) oder None; abgelaufene Eintraege nur mit allow_stale."""
+        now = time.time()
+        with self.lock:
+            row = self.db.execute(
+                "SELECT status, body, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or (row[2] < now and not allow_stale):
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return row[0], row[1]
+
+    def put(self, key, status, body):
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, status, body, size, expires, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, status, body, len(body), now + self.ttl_for(key), now))
+            self.puts_since_evict += 1
+            if self.puts_since_evict % 50 == 0:
+                self.db.commit()
+            if self.puts_since_evict >= 500:
+                self._evict()
+
+    def _evict(self):
+        """Aelteste Zugriffe loeschen, bis der Cache wieder unter max_bytes liegt."""
+        self.puts_since_evict = 0
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            self.db.commit()
+            return
+        freed = 0
+        victims = []
+        for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY last_access"):
+            victims.append((key,))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        self.db.executemany("DELETE FROM responses WHERE key = ?", victims)
+        self.db.commit()
+
+    def close(self):
+        with self.lock:
+            self._evict()
+            self.db.close()
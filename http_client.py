@@ -0,0 +1,125 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_cache import CacheMiss, CachedResponse
+
+# Statuscodes, bei denen ein erneuter Versuch sinnvoll ist
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Globaler Rate-Limiter: hoechstens `rate` Anfragen pro Sekunde (Burst bis `capacity`)."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HttpClient:
+    """Gemeinsamer HTTP-Client fuer alle Worker: Rate-Limit, Parallelitaet pro Host und Retries."""
+
+    def __init__(self, rate=40, per_host=8, retries=5, backoff=0.5, timeout=20, user_agent=None,
+                 cache=None, offline=False):
+        if offline and cache is None:
+            raise ValueError("Offline-Modus braucht einen Cache, aus dem gelesen wird")
+        self.cache = cache
+        self.offline = offline
+        self.bucket = TokenBucket(rate)
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.host_limits = {}
+        self.host_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=per_host)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if user_agent:
+            self.session.headers.update({'User-Agent': user_agent})
+
+    @contextmanager
+    def host_slot(self, url):
+        """Begrenzt die gleichzeitigen Anfragen pro Host."""
+        host = urlparse(url).netloc
+        with self.host_lock:
+            sem = self.host_limits.get(host)
+            if sem is None:
+                sem = self.host_limits[host] = threading.BoundedSemaphore(self.per_host)
+        with sem:
+            yield
+
+    def _sleep_before_retry(self, attempt, resp=None):
+        retry_after = resp.headers.get("Retry-After") if resp is not None else None
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = self.backoff * (2 ** attempt)
+        time.sleep(delay + random.uniform(0, self.backoff))
+
+    def get(self, url, params=None, headers=None):
+        """GET ueber den Cache; nur bei fehlendem/abgelaufenem Eintrag geht die Anfrage ins Netz.
+
+        Im Offline-Modus werden auch abgelaufene Eintraege verwendet und fehlende
+        Eintraege loesen CacheMiss aus.
+        """
+        if self.cache is None:
+            return self._fetch(url, params, headers)
+
+        key = self.cache.make_key(url, params)
+        cached = self.cache.get(key, allow_stale=self.offline)
+        if cached is not None:
+            return CachedResponse(*cached)
+        if self.offline:
+            raise CacheMiss(key)
+
+        resp = self._fetch(url, params, headers)
+        # 404 mitspeichern, damit unbekannte IDs nicht bei jedem Lauf erneut abgefragt werden
+        if resp.status_code in (200, 404):
+            self.cache.put(key, resp.status_code, resp.content)
+        return resp
+
+    def _fetch(self, url, params=None, headers=None):
+        """GET mit Token-Bucket, Host-Limit und Backoff bei 429/5xx und Verbindungsfehlern."""
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            try:
+                with self.host_slot(url):
+                    resp = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+                self._sleep_before_retry(attempt)
+                continue
+
+            if resp.status_code in RETRY_STATUS:
+                if attempt == self.retries:
+                    resp.raise_for_status()
+                self._sleep_before_retry(attempt, resp)
+                continue
+            return resp
+
+    def get_json(self, url, params=None, headers=None):
+        return self.get(url, params=params, headers=headers).json()
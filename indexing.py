@@ -1,13 +1,31 @@
+import numpy as np
 import pandas as pd
-import wikipediaapi
-import re
-from urllib.parse import urlparse, unquote, quote
-from tantivy import Facet, SchemaBuilder, Index, Document
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.json as pa_json
+import pyarrow.parquet as pq
+from urllib.parse import unquote
+from tantivy import SchemaBuilder, Index, Document
 from itertools import islice
+from collections import deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+import argparse
+import codecs
+import csv
+import io
 import json
-import requests
 import os
+import shutil
 from dotenv import load_dotenv
+import analyzers
+from catalog import SNAPSHOT_NAME, Catalog, index_state
+from http_cache import ResponseCache
+from http_client import HttpClient
+import facets
+import similar
+import tags
 import trailer
 import time
 
@@ -16,8 +34,25 @@ TMDB_FIND_API = "https://api.themoviedb.org/3/find/"
 TMDB_SEARCH_API = "https://api.themoviedb.org/3/search/tv"
 TMDB_DETAILS_API = "https://api.themoviedb.org/3/tv/"
 SOURCE_PARAMS = "?external_source=imdb_id&language=de-DE"
-SEARCH_PARAMS = "&language=de-DE"
+# Details, Credits, Videos und Plattformen in einer einzigen Anfrage
+DETAILS_PARAMS = {
+    "language": "de-DE",
+    "append_to_response": "credits,videos,watch/providers",
+    "include_video_language": "de,en",
+}
+WIKI_API = "https://de.wikipedia.org/w/api.php"
 INDEX_PATH = "serien_db"
+MANIFEST_NAME = "manifest.json"
+# Zwischenstand beim Kompaktieren; wird erst am Ende gegen serien_db getauscht
+COMPACT_TMP_PATH = INDEX_PATH + ".compact"
+# Angereicherter Datensatz (Ergebnis der Fetch-Stufe, Eingabe der Build-Stufe)
+ENRICHED_PATH = "serien_enriched"
+FETCH_TMP_PATH = ENRICHED_PATH + ".tmp"
+CHECKPOINT_PATH = os.path.join(FETCH_TMP_PATH, "checkpoint.json")
+# Spalten, die die Fetch-Stufe an die CSV-Spalten anhaengt
+ENRICHMENT_COLUMNS = ["wiki_summary", "tmdb_result", "tmdb_details"]
+CACHE_PATH = "http_cache.sqlite"
+CSV_BLOCK_SIZE = 4 << 20  # Bytes pro Block beim Streamen der CSVs
 load_dotenv()
 
 # API KEY
@@ -29,9 +64,12 @@ headers = {
 
 # 1. SCHEMA
 schema_builder = SchemaBuilder()
-schema_builder.add_text_field("wikidata", stored=True)
+# raw: die Wikidata-URL bleibt ein einziger Term (Schluessel fuer Upserts/Loeschungen)
+schema_builder.add_text_field("wikidata", stored=True, tokenizer_name='raw')
 schema_builder.add_text_field("url", stored=True)
 schema_builder.add_text_field("title", stored=True, tokenizer_name='de_stem')
+# Titel als Trigramme fuer Teilwort-Treffer ("hrone" -> "Game of Thrones"); nur Dokumentlisten, ohne Positionen
+schema_builder.add_text_field("title_ngram", tokenizer_name=analyzers.NGRAM_TOKENIZER, index_option="basic")
 schema_builder.add_text_field("description", stored=True, tokenizer_name='de_stem')
 schema_builder.add_text_field("image", stored=True)
 
@@ -52,29 +90,23 @@ schema_builder.add_integer_field("id", stored=True, indexed=True)
 schema_builder.add_integer_field("score", stored=True, fast=True)
 schema_builder.add_integer_field("start", stored=True, fast=True)
 schema_builder.add_integer_field("tmdb_vote_count", stored=True, fast=True)
-schema_builder.add_integer_field("is_based_on_book", stored=True, indexed=True)
-schema_builder.add_integer_field("is_true_story", stored=True, indexed=True)
+# Flags aus dem Tag-Woerterbuch (is_based_on_book, is_true_story, ...)
+for tag_field in tags.TAGS:
+    schema_builder.add_integer_field(tag_field, stored=True, indexed=True)
 schema_builder.add_float_field("tmdb_popularity", stored=True, fast=True)
 schema_builder.add_float_field("tmdb_vote_average", stored=True, fast=True)
+# Sortierschluessel "Top Rated": Bewertung erst ab TOP_RATED_MIN_VOTES Stimmen, sonst 0
+schema_builder.add_float_field("rating_rank", fast=True)
 
-# Facetten
+# Facetten: kanonische Filter-Genres/-Anbieter aus facets.py (nicht die Rohwerte)
 schema_builder.add_facet_field("facet_genres")
 schema_builder.add_facet_field("facet_providers")
 
 schema = schema_builder.build()
 
-if not os.path.exists(INDEX_PATH):
-    os.makedirs(INDEX_PATH)
-
-index = Index(schema, path=str(INDEX_PATH))
-writer = index.writer()
-
-# WIKI
+# HTTP (TMDB + Wikipedia teilen sich Rate-Limit und Verbindungen, siehe main())
 custom_user_agent = "MySeriesBot/1.0 (test@example.com)"
-session = requests.Session()
-session.headers.update({'User-Agent': custom_user_agent})
-wiki = wikipediaapi.Wikipedia(language='de', user_agent=custom_user_agent)
-wiki.session = session
+client = None
 
 GENRE_MAP = {
     "Comedy": "Komödie", "Science Fiction": "Science-Fiction", "Sci-Fi": "Science-Fiction",
@@ -85,210 +117,697 @@ GENRE_MAP = {
     "History": "Historisch", "Talk": "Stand-Up"
 }
 
-# Mapping: TMDB Provider-Namen auf unsere einheitlichen Namen
-PROVIDER_NAME_MAP = {
-    "Netflix": "Netflix",
-    "Netflix basic with Ads": "Netflix",
-    "Amazon Prime Video": "Amazon Prime",
-    "Amazon Video": "Amazon Prime",
-    "Disney Plus": "Disney+",
-    "Disney+": "Disney+",
-    "Paramount Plus": "Paramount+",
-    "Paramount+ Amazon Channel": "Paramount+",
-    "Paramount Plus Apple TV Channel": "Paramount+",
-    "HBO Max": "HBO Max",
-    "Max": "HBO Max",
-    "Max Amazon Channel": "HBO Max",
-    "Apple TV Plus": "Apple TV+",
-    "Apple TV+": "Apple TV+",
-    "WOW": "WOW",
-    "Sky Go": "WOW",
-    "Sky Ticket": "WOW",
-    "Joyn": "Joyn",
-    "Joyn Plus": "Joyn",
-    "RTL+": "RTL+",
-    "RTL Plus": "RTL+",
-    "Amazon Freevee": "Amazon Freevee",
-    "Freevee": "Amazon Freevee",
-    "Crunchyroll": "Crunchyroll",
-    "MagentaTV": "MagentaTV",
-    "ARD Mediathek": "ARD Mediathek",
-    "ZDF": "ZDF Mediathek",
-    "ZDF Mediathek": "ZDF Mediathek",
-    "Hulu": "Hulu",
-}
-
 
-def get_watch_providers_de(tmdb_id):
-    """Holt die echten Streaming-Plattformen fuer Deutschland von der TMDB API."""
-    providers_found = set()
+def detect_csv_format(path):
+    """Kodierung (utf8, sonst latin1) und Trennzeichen bestimmen, ohne die Datei zu laden."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    encoding = "utf8"
+    with open(path, "rb") as f:
+        try:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                decoder.decode(chunk)
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            encoding = "latin1"
+    with open(path, "r", encoding=encoding, newline="") as f:
+        sample = f.read(64 * 1024)
     try:
-        url = f"{TMDB_DETAILS_API}{tmdb_id}/watch/providers"
-        resp = requests.get(url, headers=headers)
-        data_wp = resp.json()
-
-        de_data = data_wp.get("results", {}).get("DE", {})
-
-        # flatrate = Streaming-Abo (Netflix, Disney+ etc.)
-        for p in de_data.get("flatrate", []):
-            name = p.get("provider_name", "")
-            mapped = PROVIDER_NAME_MAP.get(name)
-            if mapped:
-                providers_found.add(mapped)
-
-        # ads = Kostenlos mit Werbung (Freevee, Joyn etc.)
-        for p in de_data.get("ads", []):
-            name = p.get("provider_name", "")
-            mapped = PROVIDER_NAME_MAP.get(name)
-            if mapped:
-                providers_found.add(mapped)
-
-        # free = Komplett kostenlos (ARD, ZDF etc.)
-        for p in de_data.get("free", []):
-            name = p.get("provider_name", "")
-            mapped = PROVIDER_NAME_MAP.get(name)
-            if mapped:
-                providers_found.add(mapped)
-
-    except Exception as e:
-        print(f"  Watch Providers Fehler: {e}")
-
-    return list(providers_found)
+        delimiter = csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+    except csv.Error:
+        delimiter = ","
+    header = next(csv.reader(io.StringIO(sample), delimiter=delimiter))
+    return encoding, delimiter, header
+
+
+def iter_csv_batches(path):
+    """Liest eine CSV blockweise mit dem pyarrow-Reader; alle Spalten als String, kaputte Zeilen werden uebersprungen."""
+    encoding, delimiter, header = detect_csv_format(path)
+    reader = pa_csv.open_csv(
+        path,
+        read_options=pa_csv.ReadOptions(encoding=encoding, block_size=CSV_BLOCK_SIZE),
+        parse_options=pa_csv.ParseOptions(delimiter=delimiter, newlines_in_values=True,
+                                          invalid_row_handler=lambda row: "skip"),
+        convert_options=pa_csv.ConvertOptions(column_types={c: pa.string() for c in header},
+                                              strings_can_be_null=True),
+    )
+    for batch in reader:
+        yield batch
+
+
+def load_imdb_map(path="imdb.csv"):
+    """Kleinere Tabelle fuer den Hash-Join: Wikidata-URL -> erste IMDb-ID."""
+    imdb_map = {}
+    for batch in iter_csv_batches(path):
+        for series, imdb in zip(batch.column("series").to_pylist(), batch.column("imdb").to_pylist()):
+            imdb_map.setdefault(series, imdb)
+    return imdb_map
+
+
+def wiki_titles(urls):
+    """Artikeltitel aus Wikipedia-URLs, spaltenweise (.../wiki/Happy%21_(TV_series) -> Happy! (TV series))."""
+    last = pd.Series(urls, dtype=object).str.replace(r"[?#].*$", "", regex=True).str.rsplit("/", n=1).str[-1]
+    return last.map(unquote, na_action="ignore").str.replace("_", " ", regex=False).tolist()
+
+
+def stream_series(series_path="series.csv", imdb_path="imdb.csv"):
+    """Streaming-Join von series.csv mit imdb.csv ueber die Wikidata-ID.
+
+    Liefert (Spaltennamen, Generator von SeriesRow-Tupeln). Nur imdb.csv liegt
+    komplett im Speicher; series.csv wird blockweise gelesen, der Speicherbedarf
+    waechst also nicht mit der Groesse des Wikidata-Exports.
+    """
+    print("Lade CSV Dateien...")
+    imdb_map = load_imdb_map(imdb_path)
+    _, _, header = detect_csv_format(series_path)
+    columns = header + ["imdb", "wiki_title"]
+    SeriesRow = namedtuple("SeriesRow", columns, rename=True)
+    print(f"imdb.csv geladen ({len(imdb_map)} IDs), lese series.csv im Stream...")
+
+    key = header.index("series")
+
+    def rows():
+        for batch in iter_csv_batches(series_path):
+            values = [batch.column(c).to_pylist() for c in header]
+            titles = wiki_titles(values[header.index("wikipediaPage")])
+            for fields, title in zip(zip(*values), titles):
+                # Inner Join; pop sorgt dafuer, dass jede Serie nur einmal vorkommt
+                series = fields[key]
+                if series not in imdb_map:
+                    continue
+                yield SeriesRow(*fields, imdb_map.pop(series), title)
+
+    return columns, rows()
+
+
+def load_manifest(path=INDEX_PATH):
+    """Manifest der indexierten Serien: Wikidata-URL -> Inhalts-Hash."""
+    manifest_path = os.path.join(path, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as f:
+            return json.load(f)
+    return {}
+
+
+def save_manifest(manifest, path=INDEX_PATH):
+    manifest_path = os.path.join(path, MANIFEST_NAME)
+    tmp = manifest_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, manifest_path)
+
+
+def content_hashes(df):
+    """Hash je Zeile ueber CSV-Spalten und Anreicherung (spaltenweise, stabil ueber Laeufe)."""
+    return [f"{h:016x}" for h in pd.util.hash_pandas_object(df, index=False)]
+
+
+def open_index(fresh, path=INDEX_PATH):
+    """Oeffnet den Index; bei einem Neuaufbau wird ein Index mit altem Schema verworfen."""
+    if not os.path.exists(path):
+        os.makedirs(path)
+    try:
+        return analyzers.register(Index(schema, path=str(path)))
+    except ValueError as e:
+        if not fresh:
+            raise SystemExit(f"Index passt nicht zum Schema ({e}). Bitte ohne --incremental neu bauen.")
+        print("Schema hat sich geaendert, baue Index neu auf...")
+        shutil.rmtree(path)
+        os.makedirs(path)
+        return analyzers.register(Index(schema, path=str(path)))
+
+
+# Dateiendungen der Segment-Komponenten in tantivy
+SEGMENT_COMPONENTS = {
+    "term": "Terme", "idx": "Postings", "pos": "Positionen", "store": "Dokumentspeicher",
+    "fast": "Fast Fields", "fieldnorm": "Feldnormen", "del": "Loeschmarken",
+}
 
 
-# DATEN LADEN
-print("Lade CSV Dateien...")
-try:
-    s = pd.read_csv('series.csv')
-    i = pd.read_csv("imdb.csv")
-    data = pd.merge(s, i, on='series', how='inner')
-except:
+def index_report(path=INDEX_PATH, elapsed=None):
+    """Segmente, geloeschte Dokumente und Groesse je Komponente des Index ausgeben."""
+    with open(os.path.join(path, "meta.json"), "r") as f:
+        segments = json.load(f)["segments"]
+    max_docs = sum(seg["max_doc"] for seg in segments)
+    deleted = sum((seg.get("deletes") or {}).get("num_deleted_docs", 0) for seg in segments)
+
+    sizes = {}
+    for name in os.listdir(path):
+        ext = name.rsplit(".", 1)[-1]
+        if ext in SEGMENT_COMPONENTS:
+            sizes[ext] = sizes.get(ext, 0) + os.path.getsize(os.path.join(path, name))
+
+    print(f"--- Index-Bericht ({path}) ---")
+    if elapsed is not None:
+        print(f"Bauzeit: {elapsed:.1f}s")
+    print(f"Segmente: {len(segments)}, Dokumente: {max_docs - deleted} (+{deleted} geloescht)")
+    for ext, size in sorted(sizes.items(), key=lambda item: -item[1]):
+        print(f"  {SEGMENT_COMPONENTS[ext]:<17} .{ext:<10} {size / 1024:>10.0f} KB")
+    print(f"  {'Gesamt':<29} {sum(sizes.values()) / 1024:>10.0f} KB")
+
+
+def fetch_wiki_summary(title):
+    """Einleitung des Wikipedia-Artikels (wie page.summary), leer wenn die Seite fehlt."""
+    params = {
+        "action": "query", "format": "json", "prop": "extracts",
+        "exintro": 1, "explaintext": 1, "redirects": 1, "titles": title,
+    }
+    pages = client.get_json(WIKI_API, params=params).get("query", {}).get("pages", {})
+    for page in pages.values():
+        if "missing" not in page:
+            return page.get("extract", "").strip()
+    return ""
+
+
+def slim_details(details):
+    """Nur die Teile der Detail-Antwort behalten, die der Build braucht (Cast statt kompletter Crew)."""
+    return {
+        "watch/providers": {"results": {"DE": details.get("watch/providers", {}).get("results", {}).get("DE", {})}},
+        "credits": {"cast": details.get("credits", {}).get("cast", [])[:20]},
+        "videos": details.get("videos", {}),
+    }
+
+
+def enrich_series(row):
+    """Alle Netzwerk-Abfragen fuer eine Serie (laeuft in einem Worker-Thread)."""
+    result = {"description": "", "tv_result": None, "details": None}
+
+    # Wikipedia; bei einem Fehler bleibt die Serie mit leerer Beschreibung im Datensatz
+    # (sonst wuerde build --incremental sie als entfernt loeschen)
     try:
-        s = pd.read_csv('series.csv', encoding='latin1', on_bad_lines='skip', sep=None, engine='python')
-        i = pd.read_csv("imdb.csv", encoding='latin1', on_bad_lines='skip', sep=None, engine='python')
-        data = pd.merge(s, i, on='series', how='inner')
+        result["description"] = fetch_wiki_summary(row.wiki_title)
     except Exception as e:
-        print(f"Fehler: {e}")
-        exit()
-
-print(f"Daten geladen. {len(data)} Zeilen.")
+        print(f"  Wikipedia Fehler fuer {row.seriesLabel}: {e}")
 
-
-def check_keywords(text, keywords):
-    if not text: return 0
-    text = text.lower()
-    for k in keywords:
-        if k in text: return 1
-    return 0
-
-
-# --- LIMIT: Maximale Anzahl der zu indexierenden Serien ---
-LIMIT = 7000
-print(f"Starte Indexierung von {LIMIT} Serien...")
-count = 0
-
-for idx, row in islice(data.iterrows(), LIMIT):
+    # TMDB
     try:
-        path = urlparse(row["wikipediaPage"]).path
-        title = unquote(path.split("/")[-1]).replace("_", " ")
-        page = wiki.page(title)
-        description = page.summary if page.exists() else ""
-
-        doc = Document()
-        doc.add_integer("id", idx)
-        doc.add_text("wikidata", row["series"])
-        doc.add_text("url", row["wikipediaPage"])
-        doc.add_text("title", row["seriesLabel"])
-        doc.add_text("description", description)
-
-        if pd.notna(row.get("image")): doc.add_text("image", str(row["image"]))
-        if pd.notna(row.get("startTime")): doc.add_integer("start", int(row["startTime"]))
-        if pd.notna(row.get("score")): doc.add_integer("score", int(row["score"]))
-
-        # Genre
-        raw_genre = None
-        for col in ["genres", "genre", "Genre", "genreLabel"]:
-            if col in row and pd.notna(row[col]):
-                raw_genre = row[col]
-                break
-
-        if raw_genre:
-            for g in str(raw_genre).split(","):
-                g_clean = g.strip()
-                g_german = GENRE_MAP.get(g_clean, g_clean)
-                doc.add_text("genres", g_german)
-                doc.add_facet("facet_genres", Facet.from_string(f"/{g_german.replace('/', ' ')}"))
-
-        # TMDB
+        tmdb_id = None
+        tv_result = None
+        if row.imdb:
+            data_json = client.get_json(TMDB_FIND_API + row.imdb + SOURCE_PARAMS, headers=headers)
+            if data_json.get("tv_results"):
+                tv_result = data_json["tv_results"][0]
+                tmdb_id = tv_result.get("id")
+
+        if not tmdb_id:
+            search_json = client.get_json(TMDB_SEARCH_API, headers=headers,
+                                          params={"query": row.seriesLabel, "language": "de-DE"})
+            if search_json.get("results"):
+                tv_result = search_json["results"][0]
+                tmdb_id = tv_result.get("id")
+
+        result["tv_result"] = tv_result
+
+        # --- DETAILS, CREDITS, TRAILER UND PLATTFORMEN IN EINER ANFRAGE ---
+        if tv_result and tmdb_id:
+            details = client.get_json(f"{TMDB_DETAILS_API}{tmdb_id}", headers=headers, params=DETAILS_PARAMS)
+            result["details"] = slim_details(details)
+    except Exception as e:
+        print(f"  TMDB Fehler fuer {row.seriesLabel}: {e}")
+
+    return result
+
+
+def to_record(columns, row, enrichment):
+    """Zeile fuer den Parquet-Datensatz: CSV-Spalten plus Anreicherung als JSON-Strings."""
+    record = dict(zip(columns, row))
+    record["wiki_summary"] = enrichment["description"]
+    record["tmdb_result"] = json.dumps(enrichment["tv_result"]) if enrichment["tv_result"] else None
+    record["tmdb_details"] = json.dumps(enrichment["details"]) if enrichment["details"] else None
+    return record
+
+
+def first_present(df, columns):
+    """Erster Nicht-Null-Wert je Zeile ueber mehrere moegliche Spalten."""
+    present = [c for c in columns if c in df.columns]
+    if not present:
+        return pd.Series(None, index=df.index, dtype=object)
+    return df[present].bfill(axis=1).iloc[:, 0]
+
+
+def as_objects(column):
+    """Nullable Spalte -> Python-Werte mit None (tantivy nimmt weder NaN noch numpy-Typen)."""
+    return column.astype(object).where(column.notna(), None)
+
+
+# Nur diese Felder werden aus den TMDB-JSON-Spalten gelesen, alles andere ignoriert der Parser
+PROVIDER_LIST = pa.list_(pa.struct([("provider_name", pa.string())]))
+TMDB_RESULT_SCHEMA = pa.schema([
+    ("overview", pa.string()), ("poster_path", pa.string()), ("popularity", pa.float64()),
+    ("vote_average", pa.float64()), ("vote_count", pa.int64()),
+])
+TMDB_DETAILS_SCHEMA = pa.schema([
+    ("watch/providers", pa.struct([("results", pa.struct([("DE", pa.struct([
+        ("flatrate", PROVIDER_LIST), ("ads", PROVIDER_LIST), ("free", PROVIDER_LIST)]))]))])),
+    ("credits", pa.struct([("cast", pa.list_(pa.struct([("name", pa.string())])))])),
+    ("videos", pa.struct([("results", pa.list_(pa.struct([
+        ("site", pa.string()), ("type", pa.string()), ("iso_639_1", pa.string()), ("key", pa.string())])))])),
+])
+
+
+def parse_json_column(values, schema):
+    """JSON-Strings einer Spalte in einem Durchgang mit dem pyarrow-JSON-Reader parsen (fehlend -> null)."""
+    if len(values) == 0:
+        return schema.empty_table()
+    lines = "\n".join(v if isinstance(v, str) else "{}" for v in values).encode("utf-8")
+    return pa_json.read_json(
+        io.BytesIO(lines),
+        read_options=pa_json.ReadOptions(block_size=len(lines) + 1),
+        parse_options=pa_json.ParseOptions(explicit_schema=schema, unexpected_field_behavior="ignore"),
+    )
+
+
+def group_by_parent(lists):
+    """Listen-Spalte -> (flache Werte, Zeilenindex je Wert); null-Listen liefern nichts."""
+    return pc.list_flatten(lists), pc.list_parent_indices(lists).to_numpy()
+
+
+def watch_providers_de(details):
+    """Plattformen fuer Deutschland je Zeile (Abo, mit Werbung, kostenlos), gemappt ueber facets.PROVIDER_NAME_MAP."""
+    de = pc.struct_field(details.column("watch/providers").combine_chunks(), ["results", "DE"])
+    providers = [[] for _ in range(len(details))]
+    for kind in ("flatrate", "ads", "free"):
+        flat, parents = group_by_parent(pc.struct_field(de, kind))
+        for row, name in zip(parents, pc.struct_field(flat, "provider_name").to_pylist()):
+            mapped = facets.PROVIDER_NAME_MAP.get(name)
+            if mapped and mapped not in providers[row]:
+                providers[row].append(mapped)
+    return providers
+
+
+def top_actors(details, n=5):
+    """Die ersten n Schauspieler je Zeile."""
+    cast = pc.struct_field(details.column("credits").combine_chunks(), "cast")
+    flat, parents = group_by_parent(pc.list_slice(cast, 0, n))
+    actors = [[] for _ in range(len(details))]
+    for row, name in zip(parents, pc.struct_field(flat, "name").to_pylist()):
+        actors[row].append(name)
+    return actors
+
+
+def trailer_keys(details):
+    """Trailer je Zeile (Auswahl siehe trailer.get_keys)."""
+    return trailer.get_keys(pc.struct_field(details.column("videos").combine_chunks(), "results"))
+
+
+def genre_lists(raw):
+    """Genre-Strings aufteilen, explodieren, ueber GENRE_MAP eindeutschen und wieder je Zeile sammeln."""
+    positions = pd.Series(raw.to_numpy(), index=np.arange(len(raw)))
+    genres = positions.str.split(",").explode().str.strip()
+    genres = genres.map(GENRE_MAP).fillna(genres)
+    genres = genres[genres.notna() & (genres != "")]
+    # explode erhaelt die Reihenfolge, also genuegt ein Split an den Zeilengrenzen
+    lists = [[] for _ in range(len(raw))]
+    rows, starts = np.unique(genres.index.to_numpy(), return_index=True)
+    for row, chunk in zip(rows, np.split(genres.to_numpy(), starts[1:])):
+        lists[row] = chunk.tolist()
+    return lists
+
+
+def preprocess(df):
+    """Spaltenweise Vorverarbeitung eines Batches aus dem Datensatz.
+
+    Alles, was vorher pro Zeile in build_document passierte (Typumwandlungen,
+    Null-Pruefungen, Genre-Mapping, JSON-Auswertung), laeuft hier ueber ganze
+    Spalten. build_document liest danach nur noch fertige Werte.
+    """
+    out = {}
+    out["id"] = as_objects(pd.to_numeric(df["series"].str.extract(r"Q(\d+)$", expand=False),
+                                         errors="coerce").astype("Int64"))
+    out["wikidata"] = df["series"]
+    out["url"] = df["wikipediaPage"]
+    out["title"] = df["seriesLabel"]
+    out["description"] = df["wiki_summary"].fillna("")
+    out["image"] = as_objects(first_present(df, ["image"]))
+    # CSV-Werte liegen als Strings vor ("2015", "93.0")
+    out["start"] = as_objects(pd.to_numeric(first_present(df, ["startTime"]), errors="coerce").astype("Int64"))
+    out["score"] = as_objects(pd.to_numeric(first_present(df, ["score"]), errors="coerce").astype("Int64"))
+    out["genres"] = genre_lists(first_present(df, ["genres", "genre", "Genre", "genreLabel"]))
+
+    # TMDB: beide JSON-Spalten werden blockweise geparst statt json.loads pro Zeile
+    tv = parse_json_column(df["tmdb_result"].to_numpy(), TMDB_RESULT_SCHEMA)
+    details = parse_json_column(df["tmdb_details"].to_numpy(), TMDB_DETAILS_SCHEMA)
+    out["has_tmdb"] = df["tmdb_result"].notna().to_numpy()
+    out["overview"] = pd.Series(pc.fill_null(tv.column("overview"), "").to_pylist(), index=df.index)
+    out["poster"] = tv.column("poster_path").to_pylist()
+    out["popularity"] = pc.fill_null(tv.column("popularity"), 0.0).to_pylist()
+    out["vote_average"] = pc.fill_null(tv.column("vote_average"), 0.0).to_pylist()
+    out["vote_count"] = pc.fill_null(tv.column("vote_count"), 0).to_pylist()
+
+    # Alle Flags in einem Durchlauf ueber Beschreibung + Overview (siehe tags.py)
+    out.update(tags.extract(out["description"] + " " + out["overview"]))
+
+    out["providers"] = watch_providers_de(details)
+    out["actors"] = top_actors(details)
+    out["trailer"] = trailer_keys(details)
+    return pd.DataFrame(out, index=df.index)
+
+
+def build_document(rec):
+    """Baut das tantivy-Dokument aus einer vorverarbeiteten Zeile (siehe preprocess)."""
+    doc = Document()
+    doc.add_integer("id", rec.id)
+    doc.add_text("wikidata", rec.wikidata)
+    doc.add_text("url", rec.url)
+    doc.add_text("title", rec.title)
+    doc.add_text("title_ngram", rec.title)
+    doc.add_text("description", rec.description)
+
+    if rec.image is not None: doc.add_text("image", rec.image)
+    if rec.start is not None: doc.add_integer("start", rec.start)
+    if rec.score is not None: doc.add_integer("score", rec.score)
+
+    for g in rec.genres:
+        doc.add_text("genres", g)
+    for name in facets.canonical_genres(rec.genres):
+        doc.add_facet("facet_genres", facets.facet(name))
+
+    # TMDB
+    if rec.has_tmdb:
+        doc.add_text("tmdb_overview", rec.overview)
+        if rec.poster: doc.add_text("tmdb_poster_path", rec.poster)
+        doc.add_float("tmdb_popularity", rec.popularity)
+        doc.add_float("tmdb_vote_average", rec.vote_average)
+        doc.add_integer("tmdb_vote_count", rec.vote_count)
+        doc.add_float("rating_rank", rec.vote_average if rec.vote_count >= facets.TOP_RATED_MIN_VOTES else 0.0)
+        for tag_field in tags.TAGS:
+            doc.add_integer(tag_field, getattr(rec, tag_field))
+
+        for prov in rec.providers:
+            doc.add_text("providers", prov)
+        for name in facets.canonical_providers(rec.providers):
+            doc.add_facet("facet_providers", facets.facet(name))
+        for actor in rec.actors:
+            doc.add_text("actors", actor)
+        if isinstance(rec.trailer, str):
+            doc.add_text("trailer", rec.trailer)
+
+    return doc
+
+
+class EnrichmentPipeline:
+    """Reichert Zeilen parallel an, liefert sie aber in Eingabe-Reihenfolge zurueck.
+
+    Es sind hoechstens `workers * 4` Zeilen gleichzeitig unterwegs, damit der
+    Speicher auch bei grossen CSVs begrenzt bleibt. `position` zaehlt die bereits
+    ausgelieferten Zeilen (auch fehlerhafte) fuer den Checkpoint.
+    """
+
+    def __init__(self, rows, workers, known=None):
+        self.rows = rows
+        self.workers = workers
+        self.known = known or {}
+        self.pending = deque()
+        self.position = 0
+
+    def _submit(self, pool, row):
+        # Anreicherung aus einem Checkpoint wiederverwenden statt neu abzufragen
+        known = self.known.pop(row.series, None)
+        if known is not None:
+            future = Future()
+            future.set_result(known)
+            return future
+        return pool.submit(enrich_series, row)
+
+    def _finish(self):
+        idx, row, future = self.pending.popleft()
+        self.position += 1
         try:
-            tmdb_id = None
-            tv_result = None
-            if pd.notna(row.get("imdb")):
-                resp = requests.get(TMDB_FIND_API + str(row["imdb"]) + SOURCE_PARAMS, headers=headers)
-                data_json = resp.json()
-                if data_json.get("tv_results"):
-                    tv_result = data_json["tv_results"][0]
-                    tmdb_id = tv_result.get("id")
-
-            if not tmdb_id:
-                search_url = f"{TMDB_SEARCH_API}?query={quote(row['seriesLabel'])}{SEARCH_PARAMS}"
-                resp_search = requests.get(search_url, headers=headers)
-                search_json = resp_search.json()
-                if search_json.get("results"):
-                    tv_result = search_json["results"][0]
-                    tmdb_id = tv_result.get("id")
-
-            if tv_result:
-                doc.add_text("tmdb_overview", tv_result.get("overview", ""))
-                poster = tv_result.get("poster_path")
-                if poster: doc.add_text("tmdb_poster_path", poster)
-                doc.add_float("tmdb_popularity", tv_result.get("popularity", 0.0))
-                doc.add_float("tmdb_vote_average", tv_result.get("vote_average", 0.0))
-                doc.add_integer("tmdb_vote_count", tv_result.get("vote_count", 0))
-
-                full_text = (description + " " + tv_result.get("overview", "")).lower()
-                doc.add_integer("is_based_on_book",
-                                check_keywords(full_text, ["buch", "roman", "novel", "book", "basiert auf"]))
-                doc.add_integer("is_true_story", check_keywords(full_text,
-                                                                ["wahre begebenheit", "true story", "biografie",
-                                                                 "biography"]))
-
-                # --- ECHTE PLATTFORMEN VON TMDB HOLEN ---
-                if tmdb_id:
-                    time.sleep(0.05)
-
-                    # Watch Providers fuer Deutschland
-                    real_providers = get_watch_providers_de(tmdb_id)
-                    for prov in real_providers:
-                        doc.add_text("providers", prov)
-                        doc.add_facet("facet_providers", Facet.from_string(f"/{prov}"))
-
-                    if real_providers:
-                        print(f"  [{row['seriesLabel']}] Plattformen: {', '.join(real_providers)}")
-
-                    # Credits (Schauspieler)
-                    c = requests.get(f"{TMDB_DETAILS_API}{tmdb_id}/credits", headers=headers).json()
-                    for cast in c.get('cast', [])[:5]:
-                        doc.add_text("actors", cast['name'])
-
-                    # Trailer
-                    v = requests.get(f"{TMDB_DETAILS_API}{tmdb_id}/videos?language=de-DE", headers=headers)
-                    res_v = v.json()
-                    if not res_v.get('results'):
-                        v = requests.get(f"{TMDB_DETAILS_API}{tmdb_id}/videos", headers=headers)
-                    key = trailer.get_key(v.text)
-                    if isinstance(key, str):
-                        doc.add_text("trailer", key)
+            return idx, row, future.result()
         except Exception as e:
-            print(f"  TMDB Fehler fuer {row['seriesLabel']}: {e}")
+            print(f"Fehler Zeile {idx}: {e}")
+            return None
 
-        writer.add_document(doc)
-        count += 1
-        if count % 20 == 0: print(f"{count} Serien verarbeitet...")
+    def in_flight(self):
+        """Fertige, aber noch nicht geschriebene Anreicherungen (Wikidata-URL -> Ergebnis)."""
+        return {row.series: future.result() for _, row, future in self.pending
+                if future.done() and not future.cancelled() and future.exception() is None}
 
-    except Exception as e:
-        print(f"Fehler Zeile {idx}: {e}")
-
-writer.commit()
-writer.wait_merging_threads()
-print(f"FERTIG! {count} Serien indexiert.")
\ No newline at end of file
+    def __iter__(self):
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            for idx, row in self.rows:
+                self.pending.append((idx, row, self._submit(pool, row)))
+                if len(self.pending) >= self.workers * 4:
+                    done = self._finish()
+                    if done: yield done
+            while self.pending:
+                done = self._finish()
+                if done: yield done
+        finally:
+            # Bei Abbruch nicht auf noch wartende Anfragen warten
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def load_checkpoint():
+    if os.path.exists(CHECKPOINT_PATH):
+        with open(CHECKPOINT_PATH, "r") as f:
+            return json.load(f)
+    return None
+
+
+def save_checkpoint(state):
+    tmp = CHECKPOINT_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, default=str)
+    os.replace(tmp, CHECKPOINT_PATH)
+
+
+def fetch(args):
+    """Stufe 1 (Netzwerk): CSV-Zeilen + TMDB/Wikipedia-Antworten als Parquet-Teile speichern.
+
+    Geschrieben wird nach FETCH_TMP_PATH; erst ein vollstaendiger Lauf ersetzt
+    ENRICHED_PATH, sodass `build` waehrenddessen den alten Stand weiter nutzen kann.
+    Gibt False zurueck, wenn der Lauf abgebrochen wurde.
+    """
+    checkpoint = load_checkpoint() if args.resume else None
+    if args.resume and checkpoint is None:
+        print("Kein Checkpoint gefunden, starte neu.")
+    if checkpoint:
+        # Limit des abgebrochenen Laufs uebernehmen
+        args.limit = checkpoint["limit"]
+        print(f"Setze fort ab Zeile {checkpoint['position']} ({checkpoint['parts']} Teile bereits geschrieben).")
+    else:
+        shutil.rmtree(FETCH_TMP_PATH, ignore_errors=True)
+        os.makedirs(FETCH_TMP_PATH)
+
+    columns, rows = stream_series()
+    if checkpoint and checkpoint["columns"] != columns:
+        raise SystemExit("Die CSV-Spalten haben sich seit dem Checkpoint geaendert, bitte ohne --resume neu starten.")
+    arrow_schema = pa.schema([(c, pa.string()) for c in columns + ENRICHMENT_COLUMNS])
+    offset = checkpoint["position"] if checkpoint else 0
+    part = checkpoint["parts"] if checkpoint else 0
+    known = checkpoint["in_flight"] if checkpoint else None
+
+    pipeline = EnrichmentPipeline(islice(enumerate(rows), offset, args.limit), args.workers, known=known)
+    buffer = []
+    processed = 0  # vollstaendig verarbeitete Zeilen seit offset
+
+    def flush():
+        """Puffer als neuen Parquet-Teil schreiben, danach ist der Stand bis `position` sicher."""
+        nonlocal part, buffer
+        if buffer:
+            table = pa.Table.from_pylist(buffer, schema=arrow_schema)
+            pq.write_table(table, os.path.join(FETCH_TMP_PATH, f"part-{part:05d}.parquet"))
+            part += 1
+            buffer = []
+        save_checkpoint({
+            "limit": args.limit, "columns": columns, "position": offset + processed,
+            "parts": part, "in_flight": pipeline.in_flight(),
+        })
+
+    print(f"Hole Daten fuer {args.limit} Serien mit {args.workers} Workern...")
+    started = time.monotonic()
+    try:
+        for idx, row, enrichment in pipeline:
+            buffer.append(to_record(columns, row, enrichment))
+            processed = pipeline.position
+            if processed % 20 == 0:
+                rate = processed / (time.monotonic() - started)
+                print(f"{offset + processed} Serien abgefragt... ({rate:.1f} Serien/s)")
+            if len(buffer) >= args.batch_size:
+                flush()
+    except KeyboardInterrupt:
+        flush()
+        print(f"Abgebrochen nach {offset + processed} Zeilen. Fortsetzen mit: python indexing.py fetch --resume")
+        return False
+
+    flush()
+    os.remove(CHECKPOINT_PATH)
+    shutil.rmtree(ENRICHED_PATH, ignore_errors=True)
+    os.replace(FETCH_TMP_PATH, ENRICHED_PATH)
+    elapsed = time.monotonic() - started
+    print(f"Datensatz geschrieben: {ENRICHED_PATH} ({part} Teile) in {elapsed:.0f}s "
+          f"({processed / max(elapsed, 1e-9):.1f} Serien/s).")
+    return True
+
+
+def build(args, path=INDEX_PATH, threads=None):
+    """Stufe 2 (offline): serien_db aus dem angereicherten Datensatz bauen.
+
+    Dokumente werden pro Parquet-Batch erzeugt; der tantivy-Writer indexiert
+    mit --threads Threads. Mit --incremental werden nur geaenderte Serien ersetzt.
+    """
+    if not os.path.exists(ENRICHED_PATH):
+        raise SystemExit(f"{ENRICHED_PATH} fehlt. Zuerst: python indexing.py fetch")
+    dataset = ds.dataset(ENRICHED_PATH, format="parquet")
+
+    index = open_index(fresh=not args.incremental, path=path)
+    # Jeder Writer-Thread schreibt eigene Segmente; tantivy verlangt mind. 15 MB Heap pro Thread
+    try:
+        writer = index.writer(args.heap_mb * 1_000_000, args.threads if threads is None else threads)
+    except ValueError as e:
+        raise SystemExit(f"Writer konnte nicht angelegt werden ({e}). --heap-mb erhoehen oder --threads senken.")
+
+    if args.incremental:
+        manifest = load_manifest(path)
+        # Tombstones: Serien, die nicht mehr im Datensatz stehen
+        current = set(dataset.to_table(columns=["series"]).column("series").to_pylist())
+        removed = [wid for wid in manifest if wid not in current]
+        for wid in removed:
+            writer.delete_documents_by_term("wikidata", wid)
+            del manifest[wid]
+        print(f"Inkrementell: {len(manifest)} Serien im Manifest, {len(removed)} entfernt.")
+    else:
+        manifest = {}
+        writer.delete_all_documents()
+
+    count = 0
+    unchanged = 0
+    started = time.monotonic()
+
+    for batch in dataset.to_batches(batch_size=args.batch_size):
+        df = batch.to_pandas()
+        digests = content_hashes(df)
+        changed = [manifest.get(wid) != digest for wid, digest in zip(df["series"], digests)]
+        unchanged += len(changed) - sum(changed)
+        df = df[changed]
+        digests = [d for d, c in zip(digests, changed) if c]
+
+        docs = []
+        for rec, digest in zip(preprocess(df).itertuples(index=False), digests):
+            try:
+                docs.append((rec.wikidata, digest, build_document(rec)))
+            except Exception as e:
+                print(f"Fehler bei {rec.title}: {e}")
+
+        for wid, digest, doc in docs:
+            if args.incremental:
+                writer.delete_documents_by_term("wikidata", wid)
+            writer.add_document(doc)
+            manifest[wid] = digest
+        count += len(docs)
+
+        if args.incremental:
+            writer.commit()
+            save_manifest(manifest, path)
+        rate = count / max(time.monotonic() - started, 1e-9)
+        print(f"{count} Serien indexiert... ({rate:.0f} Dok/s)")
+
+    writer.commit()
+    # Dateien zusammengefuehrter Segmente entfernen, solange der Writer noch offen ist
+    writer.garbage_collect_files()
+    writer.wait_merging_threads()
+    save_manifest(manifest, path)
+    write_catalog_snapshot(path)
+    elapsed = time.monotonic() - started
+    print(f"FERTIG! {count} Serien indexiert in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f} Dok/s), "
+          f"{unchanged} unveraendert.")
+    return elapsed
+
+
+def write_catalog_snapshot(path=INDEX_PATH):
+    """catalog.bin fuer die App: Katalogspalten und aehnliche Serien passend zum gerade committeten Index-Stand."""
+    index = Index.open(str(path))
+    started = time.monotonic()
+    catalog = Catalog.from_index(index, neighbors=True)
+    catalog.save(os.path.join(path, SNAPSHOT_NAME), index_state(path))
+    print(f"Katalog-Snapshot: {len(catalog)} Serien, je {similar.SIMILAR_K} aehnliche "
+          f"({time.monotonic() - started:.1f}s) -> {os.path.join(path, SNAPSHOT_NAME)}")
+
+
+def compact(args):
+    """serien_db mit einem Writer-Thread und grossem Heap neu bauen (wenige Segmente, keine Loeschmarken).
+
+    tantivy-py bietet kein explizites Merge; stattdessen wird der Index neu aus
+    serien_enriched gebaut und nur getauscht, wenn er dieselben Serien im selben
+    Stand enthaelt wie serien_db (manifest.json). Sonst zuerst build laufen lassen.
+    """
+    args.incremental = False
+    args.heap_mb = max(args.heap_mb, args.compact_heap_mb)
+    if os.path.exists(COMPACT_TMP_PATH):
+        shutil.rmtree(COMPACT_TMP_PATH)
+    elapsed = build(args, path=COMPACT_TMP_PATH, threads=1)
+
+    if load_manifest(COMPACT_TMP_PATH) != load_manifest(INDEX_PATH):
+        shutil.rmtree(COMPACT_TMP_PATH)
+        raise SystemExit(f"{ENRICHED_PATH} passt nicht zum Manifest von {INDEX_PATH} (fetch nach dem letzten "
+                         f"Build?). Kompaktieren wuerde den Inhalt aendern; zuerst: python indexing.py build")
+
+    old_path = INDEX_PATH + ".old"
+    if os.path.exists(INDEX_PATH):
+        os.replace(INDEX_PATH, old_path)
+    os.replace(COMPACT_TMP_PATH, INDEX_PATH)
+    if os.path.exists(old_path):
+        shutil.rmtree(old_path)
+    with open(os.path.join(INDEX_PATH, "meta.json"), "r") as f:
+        print(f"Kompaktiert: {len(json.load(f)['segments'])} Segment(e).")
+    return elapsed
+
+
+def main():
+    global client
+
+    parser = argparse.ArgumentParser(description="Baut den Serien-Index aus CSV + TMDB + Wikipedia.")
+    parser.add_argument("stage", nargs="?", default="all", choices=["all", "fetch", "build", "compact", "report"],
+                        help="fetch: Daten holen (Netzwerk), build: Index offline bauen, all: beides, "
+                             "compact: Index mit einem Writer-Thread neu bauen (weniger Segmente), "
+                             "report: Segmente und Groessen anzeigen")
+    # --- LIMIT: Maximale Anzahl der zu indexierenden Serien ---
+    parser.add_argument("--limit", type=int, default=7000)
+    parser.add_argument("--workers", type=int, default=8, help="Parallele Anreicherungs-Threads")
+    parser.add_argument("--rate", type=float, default=40, help="Max. HTTP-Anfragen pro Sekunde (global)")
+    parser.add_argument("--per-host", type=int, default=8, help="Max. gleichzeitige Anfragen pro Host")
+    parser.add_argument("--cache", default=CACHE_PATH, help="SQLite-Datei fuer den HTTP-Cache")
+    parser.add_argument("--cache-max-mb", type=int, default=512)
+    parser.add_argument("--no-cache", action="store_true", help="Alles neu von den APIs holen")
+    parser.add_argument("--offline", action="store_true", help="Nur aus dem Cache lesen, kein Netzwerk")
+    parser.add_argument("--incremental", action="store_true",
+                        help="build: nur geaenderte Serien ersetzen und entfernte loeschen (statt Neuaufbau)")
+    parser.add_argument("--batch-size", type=int, default=500,
+                        help="fetch: Zeilen pro Parquet-Teil/Checkpoint, build: Dokumente pro Batch/Commit")
+    parser.add_argument("--resume", action="store_true", help="fetch: abgebrochenen Lauf am Checkpoint fortsetzen")
+    parser.add_argument("--heap-mb", type=int, default=128, help="build: Writer-Heap gesamt in MB")
+    parser.add_argument("--threads", type=int, default=0, help="build: Writer-Threads (0 = automatisch)")
+    parser.add_argument("--compact", action="store_true", help="build: danach kompaktieren (siehe compact)")
+    parser.add_argument("--compact-heap-mb", type=int, default=1024,
+                        help="compact: Heap des einzelnen Writer-Threads in MB")
+    args = parser.parse_args()
+    if args.offline and args.no_cache:
+        parser.error("--offline liest nur aus dem Cache und passt nicht zu --no-cache")
+
+    if args.stage in ("all", "fetch"):
+        cache = None if args.no_cache else ResponseCache(args.cache, max_bytes=args.cache_max_mb * 1024 * 1024)
+        client = HttpClient(rate=args.rate, per_host=args.per_host, user_agent=custom_user_agent,
+                            cache=cache, offline=args.offline)
+        try:
+            completed = fetch(args)
+        finally:
+            if cache:
+                print(f"HTTP-Cache: {cache.hits} Treffer, {cache.misses} Fehlschlaege.")
+                cache.close()
+        if not completed:
+            return
+
+    if args.stage in ("all", "build"):
+        elapsed = build(args)
+        if args.compact:
+            elapsed += compact(args)
+        index_report(elapsed=elapsed)
+    elif args.stage == "compact":
+        index_report(elapsed=compact(args))
+    elif args.stage == "report":
+        index_report()
+
+
+if __name__ == "__main__":
+    main()
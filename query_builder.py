@@ -0,0 +1,264 @@
+import re
+from collections import namedtuple
+
+from tantivy import Occur, Order, Query, SnippetGenerator
+
+import analyzers
+import facets
+from suggest import normalize
+
+# Sortierung der Suche -> Fast Field im Index (absteigend; fehlende Werte zuletzt)
+SORT_FIELDS = {
+    "Beliebtheit": "tmdb_popularity",
+    "Bewertung (Top Rated)": "rating_rank",
+    "Kritiker-Score": "score",
+    "Neuerscheinungen": "start",
+}
+# Ohne Sortierfeld ordnet der Index nach BM25-Score
+RELEVANZ = "Relevanz"
+# Ersatz in Indizes, die vor dem Feld gebaut wurden (z.B. der mitgelieferte serien_db)
+FALLBACK_SORT_FIELDS = {"rating_rank": "tmdb_vote_average"}
+
+# Freitextsuche: Felder mit Gewicht (Titel > Cast > Handlung > Beschreibung)
+FIELD_BOOSTS = {
+    "title": 4.0,
+    "actors": 3.0,
+    "tmdb_overview": 2.0,
+    "description": 1.0,
+    "genres": 1.0,
+}
+# Zeichen der tantivy-Abfragesprache; im Suchfeld sind sie normaler Text ("Star Trek: Picard")
+QUERY_SYNTAX = re.compile(r'[+\-&|!(){}\[\]^"~*?:\\/<>=]')
+# Bonus fuer Titel, die den Suchtext als Teilstring enthalten (Trigramm-Feld title_ngram);
+# groesser als uebliche BM25-Scores, damit solche Titel wie bei der frueheren Teilstring-Suche vorne stehen
+INFIX_SCORE = 100.0
+# Woerter im Suchtext fuer die Tippfehler-Korrektur (Apostrophe gehoeren dazu, wie bei suggest.normalize)
+SEARCH_WORD = re.compile(r"[\w'’`´]+")
+SNIPPET_FIELDS = ["tmdb_overview", "description"]
+SNIPPET_CHARS = 160
+# Karten pro Ergebnisseite; gerendert wird immer nur eine Seite
+PAGE_SIZE = 48
+
+Page = namedtuple("Page", ["hits", "page", "pages", "total"])
+
+
+def split_param(value):
+    return value.split(",") if value else []
+
+
+def has_field(schema, name):
+    """Kennt der Index das Feld? Ein aelterer Index (vor einem Neuaufbau) hat nicht alle Felder aus indexing.py."""
+    try:
+        Query.term_query(schema, name, "")
+    except ValueError:
+        return False
+    return True
+
+
+def canonical_facets(schema):
+    """Kanonische Namen in facet_genres/facet_providers kamen mit rating_rank; aeltere Indizes haben dort Rohwerte."""
+    return has_field(schema, "rating_rank")
+
+
+def filter_clauses(schema, genres=None, providers=None, true_story=False, book=False, catalog=None):
+    """Facetten- und Term-Klauseln (innerhalb eines Filters ODER, zwischen Filtern UND).
+
+    Ohne kanonische Facetten im Index kommen Genres und Anbieter aus den Bitsets des Katalogs (als Serien-IDs).
+    """
+    clauses = []
+    if (genres or providers) and not canonical_facets(schema):
+        ids = catalog.id[catalog.filter(genres, providers)]
+        clauses.append((Occur.Must, Query.term_set_query(schema, "id", ids.tolist())))
+        genres = providers = None
+    if genres:
+        clauses.append((Occur.Must, Query.term_set_query(
+            schema, "facet_genres", [facets.facet(g) for g in genres])))
+    if providers:
+        clauses.append((Occur.Must, Query.term_set_query(
+            schema, "facet_providers", [facets.facet(p) for p in providers])))
+    if true_story:
+        clauses.append((Occur.Must, Query.term_query(schema, "is_true_story", 1)))
+    if book:
+        clauses.append((Occur.Must, Query.term_query(schema, "is_based_on_book", 1)))
+    return clauses
+
+
+def infix_query(schema, text):
+    """Titel enthaelt den Text irgendwo: Schnittmenge der Trigramm-Postings.
+
+    None fuer zu kurze Texte und fuer Indizes ohne title_ngram (vor einem Neuaufbau).
+    """
+    grams = analyzers.ngrams(text.strip())
+    if not grams or not has_field(schema, "title_ngram"):
+        return None
+    return Query.boolean_query([(Occur.Must, Query.term_query(schema, "title_ngram", g)) for g in grams])
+
+
+def text_query(index, text, all_words=False):
+    """Freitext ueber Titel, Cast, Handlung und Beschreibung; Syntaxfehler werden toleriert.
+
+    Dazu Teilwort-Treffer im Titel ("hrone", "ing ba", "k: pic") mit festem Bonus; die
+    Trigramme kommen aus dem unveraenderten Text, QUERY_SYNTAX gilt nur fuer BM25.
+    all_words: jedes Wort muss vorkommen (sonst ODER, gerankt nach BM25).
+    """
+    words = QUERY_SYNTAX.sub(" ", text).split()
+    if all_words:
+        words = ["+" + word for word in words]
+    query, _errors = index.parse_query_lenient(" ".join(words), list(FIELD_BOOSTS), field_boosts=FIELD_BOOSTS)
+    infix = infix_query(index.schema, text)
+    if infix is None:
+        return query
+    return Query.boolean_query([
+        (Occur.Should, query),
+        (Occur.Should, Query.const_score_query(infix, INFIX_SCORE)),
+    ])
+
+
+def corrected_text(index, searcher, spelling, text):
+    """Suchtext mit korrigierten Tippfehlern, oder "" wenn es nichts zu korrigieren gibt.
+
+    Ersetzt werden nur Woerter, die in keinem Suchfeld vorkommen und fuer die das
+    Loesch-Woerterbuch (spelling.SpellIndex) ein bekanntes Wort kennt; so bleibt
+    "Braking Bad" nicht bei den Treffern fuer "bad" haengen. Alle anderen Zeichen
+    (Akzente, Satzzeichen) bleiben wie eingegeben.
+    """
+    context = spelling.context(normalize(text).split())
+
+    def fix(match):
+        words = normalize(match.group()).split()
+        result = [
+            new if new != old and searcher.search(text_query(index, old), 1, count=True).count == 0 else old
+            for old, new in ((word, spelling.correct_word(word, context)) for word in words)
+        ]
+        return " ".join(result) if result != words else match.group()
+
+    result = SEARCH_WORD.sub(fix, text)
+    return result if result != text else ""
+
+
+def query_from_params(index, catalog, qp):
+    """URL-Parameter der Grid-Ansicht (q, genres, providers, true_story, book) als Abfrage.
+
+    Die Filter zaehlen nicht zum Score, damit die Relevanz nur vom Suchtext abhaengt.
+    Bei Sortierung nach einem Feld (statt Relevanz) muessen alle Suchwoerter vorkommen;
+    sonst verdraengen lose Treffer einzelner Woerter ("die", "in") die gesuchte Serie.
+    """
+    clauses = filter_clauses(
+        index.schema,
+        genres=split_param(qp.get("genres")),
+        providers=split_param(qp.get("providers")),
+        true_story=qp.get("true_story") == "1",
+        book=qp.get("book") == "1",
+        catalog=catalog,
+    )
+    text = qp.get("q", "").strip()
+    if not text:
+        return Query.boolean_query(clauses) if clauses else Query.all_query()
+    all_words = sort_field(index.schema, qp.get("sort") or default_sort(text)) is not None
+    query = [(Occur.Must, text_query(index, text, all_words))]
+    if clauses:
+        query.append((Occur.Must, Query.const_score_query(Query.boolean_query(clauses), 0.0)))
+    return Query.boolean_query(query)
+
+
+def sort_field(schema, sort_by):
+    """Fast Field fuer die Sortierung (None = Relevanz); fehlt es im Index, das Ersatzfeld."""
+    field = SORT_FIELDS.get(sort_by)
+    if field is not None and not has_field(schema, field):
+        field = FALLBACK_SORT_FIELDS.get(field)
+    return field
+
+
+def search(index, searcher, query, sort_by, limit):
+    """Sortierung und Limit uebernimmt der Index; ohne Sortierfeld nach Relevanz."""
+    limit = max(limit, 1)
+    field = sort_field(index.schema, sort_by)
+    if field is None:
+        return searcher.search(query, limit, count=True)
+    return searcher.search(query, limit, count=True, order_by_field=field, order=Order.Desc)
+
+
+def canonical_params(qp):
+    """URL-Parameter der Grid-Ansicht in einheitlicher Form (auch Schluessel des Ergebnis-Caches).
+
+    Suchtext und Listen ohne Gross-/Kleinschreibung, Listen sortiert, Standardwerte
+    (Sortierung, erste Seite) weggelassen. Die Namen bleiben die der URL, damit
+    query_from_params und page_param das Ergebnis direkt nehmen.
+    """
+    params = {}
+    # Satzzeichen bleiben stehen: die Teilwort-Suche braucht sie ("k: pic", "spider-ma"),
+    # nur der BM25-Teil ersetzt sie (text_query)
+    text = " ".join(qp.get("q", "").lower().split())
+    if not QUERY_SYNTAX.sub("", text).strip():
+        text = ""
+    if text:
+        params["q"] = text
+    for key, names in (("genres", facets.FILTER_GENRES), ("providers", facets.FILTER_PROVIDERS)):
+        known = {name.lower(): name for name in names}
+        values = {v.strip() for v in split_param(qp.get(key)) if v.strip()}
+        values = sorted({known.get(v.lower(), v) for v in values})
+        if values:
+            params[key] = ",".join(values)
+    for flag in ("true_story", "book"):
+        if qp.get(flag) == "1":
+            params[flag] = "1"
+    sort = qp.get("sort")
+    if sort != default_sort(text) and (sort in SORT_FIELDS or (sort == RELEVANZ and text)):
+        params["sort"] = sort
+    page = page_param(qp)
+    if page:
+        params["page"] = str(page)
+    return params
+
+
+def default_sort(text):
+    """Mit Suchtext nach Relevanz, ohne gibt es keinen Score zum Sortieren."""
+    return RELEVANZ if text else "Beliebtheit"
+
+
+def cache_key(params):
+    return tuple(sorted(params.items()))
+
+
+def page_param(qp):
+    """Seitennummer aus der URL (ab 0); ungueltige Werte zaehlen als erste Seite."""
+    try:
+        return max(int(qp.get("page", "0")), 0)
+    except ValueError:
+        return 0
+
+
+def search_page(index, searcher, catalog, query, sort_by, page, max_hits=None):
+    """Treffer einer Seite (stabile Reihenfolge) plus Seitenzahl, ohne Titel-Duplikate.
+
+    Die Duplikate stehen nur im Index, nicht im Katalog; deshalb holt der Index alle
+    Treffer (max_hits begrenzt sie, Freitextsuche) und geteilt wird erst danach, so
+    sind Seiten voll und die Seitenzahl stimmt. Seiten hinter dem Ende zeigen die letzte Seite.
+    """
+    limit = searcher.num_docs if max_hits is None else max_hits
+    hits = catalog.unique_hits(search(index, searcher, query, sort_by, limit).hits)
+    pages = max(-(-len(hits) // PAGE_SIZE), 1)
+    page = min(page, pages - 1)
+    return Page(hits[page * PAGE_SIZE:(page + 1) * PAGE_SIZE], page, pages, len(hits))
+
+
+def snippets(index, searcher, text, hits):
+    """HTML-Ausschnitt mit hervorgehobenen Suchbegriffen je Treffer (Handlung, sonst Beschreibung)."""
+    query = text_query(index, text)
+    generators = []
+    for field in SNIPPET_FIELDS:
+        generator = SnippetGenerator.create(searcher, query, index.schema, field)
+        generator.set_max_num_chars(SNIPPET_CHARS)
+        generators.append(generator)
+
+    result = []
+    for _, addr in hits:
+        doc = searcher.doc(addr)
+        html = ""
+        for generator in generators:
+            snippet = generator.snippet_from_doc(doc)
+            if snippet.highlighted():
+                html = snippet.to_html()
+                break
+        result.append(html)
+    return result
@@ -0,0 +1,141 @@
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+from tantivy import Index, Query
+
+import analyzers
+from catalog import SNAPSHOT_NAME, Catalog, index_state
+from spelling import SpellIndex
+from suggest import PrefixIndex
+
+# Zusammengehoeriger Stand: Trefferadressen des Searchers passen zum Katalog und zu den Caches
+Snapshot = namedtuple("Snapshot", ["index", "searcher", "catalog", "docs", "results", "suggest", "spelling", "version"])
+# Eintraege je Stand: dekodierte Dokumente (Detailansicht) und Ergebnislisten (Grid)
+DOC_CACHE_SIZE = 256
+RESULT_CACHE_SIZE = 512
+
+
+class LRUCache:
+    """Threadsicherer LRU-Cache mit Treffer-/Fehlzaehlern; gilt fuer genau einen Index-Stand."""
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+
+class DocCache:
+    """LRU vor searcher.doc: beliebte Serien werden nicht bei jedem Aufruf neu aus dem Docstore entpackt.
+
+    Gehoert zu genau einem Searcher; nach einem Reload gibt es mit dem neuen Snapshot einen leeren Cache.
+    """
+
+    def __init__(self, index, searcher, catalog, size=DOC_CACHE_SIZE):
+        self.index = index
+        self.searcher = searcher
+        self.catalog = catalog
+        self.docs = LRUCache(size)
+
+    def address(self, series_id):
+        addr = self.catalog.doc_address(series_id)
+        if addr is None:
+            # Titel-Duplikate fehlen im Katalog; dann doch ueber den Index suchen
+            hits = self.searcher.search(Query.term_query(self.index.schema, "id", series_id), 1).hits
+            addr = hits[0][1] if hits else None
+        return addr
+
+    def get(self, series_id):
+        """Dokument zu einer Serien-ID (auch als String aus der URL); None, wenn es sie nicht gibt."""
+        try:
+            series_id = int(series_id)
+        except (TypeError, ValueError):
+            return None
+        doc = self.docs.get(series_id)
+        if doc is not None:
+            return doc
+
+        addr = self.address(series_id)
+        if addr is None:
+            return None
+        doc = self.searcher.doc(addr)
+        self.docs.put(series_id, doc)
+        return doc
+
+
+class SearchIndex:
+    """Prozessweit geteilter Index samt Searcher und Katalog; laedt neu, sobald ein Build committet.
+
+    Ein Commit schreibt meta.json neu, ein Neuaufbau/compact tauscht das ganze
+    Verzeichnis aus. Beides wird ueber os.stat erkannt, ohne den Index zu oeffnen.
+    catalog.bin zaehlt mit: der Build schreibt ihn erst nach dem Commit, die App
+    laedt dann noch einmal und ersetzt den Ersatz-Katalog aus dem Index.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.lock = threading.Lock()
+        self.snapshot = None
+
+    def version(self):
+        meta = os.stat(os.path.join(self.path, "meta.json"))
+        try:
+            snapshot = os.stat(os.path.join(self.path, SNAPSHOT_NAME))
+            snapshot = snapshot.st_mtime_ns, snapshot.st_size
+        except FileNotFoundError:
+            snapshot = None
+        return os.stat(self.path).st_ino, meta.st_mtime_ns, meta.st_size, snapshot
+
+    def current(self):
+        """Aktueller Stand; nur nach einem Commit wird neu geladen."""
+        version = self.version()
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        with self.lock:
+            if self.snapshot is None or self.snapshot.version != version:
+                self.snapshot = self.load(version)
+            return self.snapshot
+
+    def load(self, version):
+        state = index_state(self.path)
+        if self.snapshot is None or self.snapshot.version[0] != version[0]:
+            # Erster Start oder neues Verzeichnis (Neuaufbau, compact): neu oeffnen
+            index = analyzers.register(Index.open(self.path))
+        else:
+            index = self.snapshot.index
+            index.reload()
+        searcher = index.searcher()
+
+        # Katalog-Snapshot vom Build mappen, falls er zum geladenen Stand passt (sonst aus dem Index lesen)
+        catalog = None
+        if index_state(self.path) == state:
+            catalog = Catalog.open(os.path.join(self.path, SNAPSHOT_NAME), state)
+        if catalog is None:
+            catalog = Catalog.from_index(index, searcher)
+        docs = DocCache(index, searcher, catalog)
+        suggest = PrefixIndex.from_catalog(catalog)
+        spelling = SpellIndex.from_catalog(catalog)
+        return Snapshot(index, searcher, catalog, docs, LRUCache(RESULT_CACHE_SIZE), suggest, spelling, version)
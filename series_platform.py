@@ -1,8 +1,14 @@
-import json
 import os
 import urllib.parse as up
+import uuid
 import streamlit as st
-from tantivy import Query, Index, SchemaBuilder, Occur
+import streamlit.components.v1 as components
+
+import query_builder
+import typeahead
+from search_index import SearchIndex
+from watchlist import WatchlistStore
+from facets import FILTER_GENRES, FILTER_PROVIDERS, HOMEPAGE_KATEGORIEN
 
 # --- 1. SETUP ---
 st.set_page_config(page_title="PathFinder", page_icon="🧭", layout="wide")
@@ -17,26 +23,32 @@ if os.path.exists(FRAME_SRC) and not os.path.exists(FRAME_DST):
     import shutil
     shutil.copy2(FRAME_SRC, FRAME_DST)
 
-WATCHLIST_FILE = "watchlist.json"
+# Merklisten je Nutzer (SQLite); der Nutzer wird ueber ein Cookie wiedererkannt,
+# weil jeder Karten-Link die Seite neu laedt und damit eine neue Sitzung startet
+WATCHLIST_DB = "watchlist.sqlite"
+USER_COOKIE = "pathfinder_user"
 
 
-def load_watchlist():
-    if os.path.exists(WATCHLIST_FILE):
-        try:
-            with open(WATCHLIST_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return []
-    return []
+@st.cache_resource
+def get_watchlist_store():
+    return WatchlistStore(WATCHLIST_DB)
 
 
-def save_watchlist(wl):
-    with open(WATCHLIST_FILE, "w") as f:
-        json.dump(wl, f)
+def current_user():
+    """Nutzer-ID aus dem Cookie; beim ersten Besuch neu vergeben und fuer ein Jahr gesetzt."""
+    user = st.context.cookies.get(USER_COOKIE) or st.session_state.get("user")
+    if user is None:
+        user = uuid.uuid4().hex
+        components.html(
+            f"<script>parent.document.cookie = '{USER_COOKIE}={user}; max-age=31536000; path=/; SameSite=Lax';</script>",
+            height=0,
+        )
+    st.session_state.user = user
+    return user
 
 
-if 'watchlist' not in st.session_state:
-    st.session_state.watchlist = load_watchlist()
+watchlist_store = get_watchlist_store()
+user = current_user()
 if 'show_search' not in st.session_state:
     st.session_state.show_search = False
 
@@ -44,11 +56,13 @@ qp = st.query_params
 view = qp.get("view", "home")
 q_param = qp.get("q", "")
 scroll_pos = qp.get("scroll", "0")
+page_param = query_builder.page_param(qp)
 
 # --- 2. CONFIG ---
 TMDB_PATH_BIG = "https://image.tmdb.org/t/p/original"
 TMDB_PATH_SMALL = "https://image.tmdb.org/t/p/w300"
 INDEX_PATH = "serien_db"
+SEARCH_TOP_K = 200  # Freitextsuche: nur die besten Treffer anzeigen
 
 try:
     with open("styles.html", "r") as f:
@@ -85,225 +99,40 @@ document.addEventListener('click', function(e) {
 """, unsafe_allow_html=True)
 
 # --- 3. INDEX ---
-schema_builder = SchemaBuilder()
-schema_builder.add_text_field("wikidata", stored=True)
-schema_builder.add_text_field("url", stored=True)
-schema_builder.add_text_field("title", stored=True, tokenizer_name='de_stem')
-schema_builder.add_text_field("description", stored=True, tokenizer_name='de_stem')
-schema_builder.add_text_field("image", stored=True)
-schema_builder.add_text_field("genres", stored=True)
-schema_builder.add_text_field("providers", stored=True)
-schema_builder.add_text_field("countries", stored=True)
-schema_builder.add_text_field("tmdb_overview", stored=True, tokenizer_name='de_stem')
-schema_builder.add_text_field("tmdb_poster_path", stored=True)
-schema_builder.add_text_field("trailer", stored=True)
-schema_builder.add_text_field("actors", stored=True, tokenizer_name='en_stem')
-schema_builder.add_text_field("writers", stored=True, tokenizer_name='en_stem')
-schema_builder.add_integer_field("id", stored=True, indexed=True)
-schema_builder.add_integer_field("score", stored=True, fast=True)
-schema_builder.add_integer_field("start", stored=True, fast=True)
-schema_builder.add_integer_field("tmdb_vote_count", stored=True, fast=True)
-schema_builder.add_integer_field("is_based_on_book", stored=True, indexed=True)
-schema_builder.add_integer_field("is_true_story", stored=True, indexed=True)
-schema_builder.add_float_field("tmdb_popularity", stored=True, fast=True)
-schema_builder.add_float_field("tmdb_vote_average", stored=True, fast=True)
-schema_builder.add_facet_field("facet_genres")
-schema_builder.add_facet_field("facet_providers")
-schema = schema_builder.build()
+# Einmal pro Prozess geoeffnet; nach einem Build-Commit werden Searcher und Katalog
+# beim naechsten Rerun ausgetauscht (Schema kommt aus dem Index, definiert in indexing.py)
+@st.cache_resource
+def get_search_index():
+    return SearchIndex(INDEX_PATH)
+
 
 try:
-    index = Index(schema, path=str(INDEX_PATH))
-    searcher = index.searcher()
+    snapshot = get_search_index().current()
 except Exception as e:
     st.error(f"FEHLER: {e}")
     st.stop()
+index, searcher, catalog = snapshot.index, snapshot.searcher, snapshot.catalog
 
 
-# --- ALLE SERIEN LADEN (einmalig gecached) ---
-@st.cache_data
-def get_all_series():
-    """Alle Serien aus dem Index laden, deduplizieren und als Liste zurückgeben."""
-    hits = searcher.search(index.parse_query("*", ["title"]), 7000).hits
-    all_series = []
-    seen_titles = set()
-    for _, addr in hits:
-        doc = searcher.doc(addr)
-        title = doc["title"][0]
-        # Doppelte Serien anhand des Titels entfernen
-        title_lower = title.strip().lower()
-        if title_lower in seen_titles:
-            continue
-        seen_titles.add(title_lower)
-        all_series.append({
-            "id": doc["id"][0],
-            "title": title,
-            "poster": doc["tmdb_poster_path"][0] if doc["tmdb_poster_path"] else "",
-            "genres": doc["genres"] if doc["genres"] else [],
-            "providers": doc["providers"] if doc["providers"] else [],
-            "pop": doc["tmdb_popularity"][0] if doc["tmdb_popularity"] else 0.0,
-            "rate": doc["tmdb_vote_average"][0] if doc["tmdb_vote_average"] else 0.0,
-            "count": doc["tmdb_vote_count"][0] if doc["tmdb_vote_count"] else 0,
-            "score": doc["score"][0] if doc["score"] else 0,
-            "date": doc["start"][0] if doc["start"] else 0,
-            "is_true_story": doc["is_true_story"][0] if doc["is_true_story"] else 0,
-            "is_based_on_book": doc["is_based_on_book"][0] if doc["is_based_on_book"] else 0,
-        })
-    return all_series
-
-
-# --- GENRE-SYNONYME ---
-GENRE_SYNONYME = {
-    "Action & Abenteuer": ["action", "abenteuer", "adventure", "action & adventure"],
-    "Sitcom": ["sitcom", "comedy", "komödie"],
-    "Animation": ["animation", "zeichentrick", "anime", "animiert", "animated", "cartoon"],
-    "Dokumentation": ["dokumentation", "documentary", "doku"],
-    "Drama": ["drama"],
-    "Fantasy": ["fantasy", "sci-fi & fantasy"],
-    "Historisch": ["historisch", "history", "krieg", "war", "historical"],
-    "Horror": ["horror"],
-    "Komödie": ["komödie", "comedy", "komoedie"],
-    "Krimi": ["krimi", "crime", "police", "detective"],
-    "Mystery": ["mystery", "mysterie"],
-    "Romantik": ["romantik", "romance", "romantic"],
-    "Science-Fiction": ["science-fiction", "sci-fi", "science fiction", "sci fi"],
-    "Stand-Up": ["stand-up", "talk"],
-    "Thriller": ["thriller", "suspense"],
-}
-
-# Feste Genre-Liste für den Filter (nur diese!)
-FILTER_GENRES = [
-    "Action & Abenteuer",
-    "Animation",
-    "Dokumentation",
-    "Drama",
-    "Fantasy",
-    "Historisch",
-    "Horror",
-    "Komödie",
-    "Krimi",
-    "Mystery",
-    "Romantik",
-    "Science-Fiction",
-    "Sitcom",
-    "Stand-Up",
-    "Thriller",
-]
-
-# Feste Plattform-Liste für den Filter (nur diese!)
-FILTER_PROVIDERS = [
-    "Amazon Prime",
-    "Disney+",
-    "HBO Max",
-    "Joyn",
-    "Netflix",
-    "RTL+",
-]
-
-# Kategorien für die Startseite (Reihenfolge wie angezeigt)
-HOMEPAGE_KATEGORIEN = [
-    "Action & Abenteuer",
-    "Drama",
-    "Komödie",
-    "Krimi",
-    "Science-Fiction",
-    "Fantasy",
-    "Horror",
-    "Mystery",
-    "Dokumentation",
-    "Historisch",
-    "Animation",
-    "Romantik",
-    "Thriller",
-    "Sitcom",
-]
-
-
-def genre_matches(series_genres, genre_name):
-    """Prüft ob eine Serie zu einem Genre passt (Teilstring-Match)."""
-    synonyme = GENRE_SYNONYME.get(genre_name, [genre_name.lower()])
-    genre_text = " | ".join(series_genres).lower()
-    for syn in synonyme:
-        if syn in genre_text:
-            return True
-    return False
-
-
-def provider_matches(series_providers, selected_providers):
-    """Prüft ob eine Serie bei mindestens einem der gewählten Anbieter verfügbar ist."""
-    if not selected_providers:
-        return True
-    prov_text = " | ".join(series_providers).lower()
-    for sel in selected_providers:
-        sel_lower = sel.lower()
-        # Spezielle Mappings
-        if sel == "Amazon Prime":
-            if "amazon" in prov_text or "paramount" in prov_text or "apple tv" in prov_text or "apple" in prov_text:
-                return True
-        elif sel == "HBO Max":
-            if "hbo max" in prov_text or "hbo" in prov_text or "max" in prov_text:
-                return True
-        else:
-            if sel_lower in prov_text:
-                return True
-    return False
-
-
-def get_series_for_genre(all_series, genre_name, max_count=15):
-    """Filtere Serien für ein bestimmtes Genre und sortiere nach Bewertung."""
-    matching = [s for s in all_series if genre_matches(s["genres"], genre_name)]
-    matching.sort(key=lambda x: x["rate"] if x["count"] >= 5 else 0, reverse=True)
-    return matching[:max_count]
-
-
-def filter_series(all_series, query="", genres=None, providers=None,
-                  true_story=False, book=False, sort_by="Beliebtheit"):
-    """Filtere und sortiere Serien basierend auf allen Suchkriterien."""
-    results = []
-    for s in all_series:
-        # Textsuche
-        if query:
-            q_lower = query.lower()
-            title_match = q_lower in s["title"].lower()
-            genre_match = any(q_lower in g.lower() for g in s["genres"])
-            if not title_match and not genre_match:
-                continue
-
-        # Genre-Filter
-        if genres:
-            genre_found = False
-            for g in genres:
-                if genre_matches(s["genres"], g):
-                    genre_found = True
-                    break
-            if not genre_found:
-                continue
-
-        # Plattform-Filter
-        if providers:
-            if not provider_matches(s["providers"], providers):
-                continue
-
-        # Wahre Geschichte
-        if true_story and s["is_true_story"] != 1:
-            continue
+# Genre-Synonyme, Filterlisten und Anbieter-Aliase: siehe facets.py (auch vom Indexer genutzt)
 
-        # Basiert auf Buch
-        if book and s["is_based_on_book"] != 1:
-            continue
 
-        results.append(s)
+def pager(page, pages):
+    """Blaetter-Links fuer Ergebnisseiten; die Seite steht mit den Filtern in der URL."""
+    if pages <= 1:
+        return ""
+    params = {k: v for k, v in qp.to_dict().items() if k not in ("page", "scroll")}
 
-    # Sortierung
-    if sort_by == "Beliebtheit":
-        results.sort(key=lambda x: x["pop"], reverse=True)
-    elif sort_by == "Bewertung (Top Rated)":
-        results.sort(key=lambda x: x["rate"] if x["count"] >= 50 else 0, reverse=True)
-    elif sort_by == "Kritiker-Score":
-        results.sort(key=lambda x: x["score"], reverse=True)
-    elif sort_by == "Neuerscheinungen":
-        results.sort(key=lambda x: x["date"], reverse=True)
+    def link(target, label):
+        p = dict(params, page=str(target)) if target else params
+        return f'<a class="pager-link" href="?{up.urlencode(p)}" target="_self">{label}</a>'
 
-    return results
+    html = ['<div class="pager">']
+    html.append(link(page - 1, "⟨") if page > 0 else '<span class="pager-link off">⟨</span>')
+    html.append(f'<span class="pager-info">Seite {page + 1} von {pages}</span>')
+    html.append(link(page + 1, "⟩") if page < pages - 1 else '<span class="pager-link off">⟩</span>')
+    html.append("</div>")
+    return "".join(html)
 
 
 # --- 4. HEADER ---
@@ -329,7 +158,7 @@ with header:
                 st.session_state.show_search = not st.session_state.show_search
 
         with c_list:
-            count = len(st.session_state.watchlist)
+            count = watchlist_store.count(user)
             btn_label_list = f"LISTE ({count})"
             if st.button(btn_label_list, key="btn_list", use_container_width=True):
                 st.query_params["view"] = "mylist"
@@ -342,13 +171,17 @@ if st.session_state.show_search and view != "detail" and view != "mylist":
     st.markdown('<div class="popup-box">', unsafe_allow_html=True)
     st.markdown('<div class="popup-title">SUCHE & FILTER</div>', unsafe_allow_html=True)
 
-    with st.form("search_form"):
+    # Ausserhalb des Formulars, damit Vorschlaege schon beim Tippen kommen (nicht erst nach dem Absenden)
+    search_query = typeahead.typeahead(
+        "Wonach suchst du?",
+        q_param,
+        snapshot.suggest,
+        key="typeahead",
+        placeholder="z.B. Breaking Bad, Action, ein Schauspieler...",
+        params={k: qp.get(k) for k in ["genres", "providers", "sort", "true_story", "book"] if qp.get(k)},
+    )
 
-        search_query = st.text_input(
-            "Wonach suchst du?",
-            value=q_param,
-            placeholder="z.B. Breaking Bad, Action, ein Schauspieler..."
-        )
+    with st.form("search_form"):
 
         c1, c2, c3 = st.columns(3)
 
@@ -364,7 +197,7 @@ if st.session_state.show_search and view != "detail" and view != "mylist":
         )
         sort_opt = c3.selectbox(
             "Sortieren nach",
-            ["Beliebtheit", "Bewertung (Top Rated)", "Kritiker-Score", "Neuerscheinungen"]
+            [query_builder.RELEVANZ, "Beliebtheit", "Bewertung (Top Rated)", "Kritiker-Score", "Neuerscheinungen"]
         )
 
         cc1, cc2 = st.columns(2)
@@ -404,11 +237,13 @@ if st.session_state.show_search and view != "detail" and view != "mylist":
 if view == "detail":
     sid = qp.get("id")
     if sid:
-        hits = searcher.search(index.parse_query(sid, ["id"]), 1).hits
-        if hits:
-            _, addr = hits[0]
-            doc = searcher.doc(addr)
-            d_id = doc["id"][0]
+        # ID -> DocAddress aus dem Katalog, Dokument aus dem LRU-Cache des aktuellen Stands
+        doc = snapshot.docs.get(sid)
+        if doc is not None:
+            # Titel-Duplikate landen unter der ID der Katalogserie auf der Liste (sonst fehlten sie dort)
+            row = catalog.canonical_row(doc["id"][0], doc["title"][0])
+            d_id = int(catalog.id[row]) if row >= 0 else doc["id"][0]
+            on_list = watchlist_store.contains(user, d_id)
 
             # --- BUTTONS OBEN (unter dem Header) ---
             back_scroll = qp.get("scroll", "0")
@@ -416,7 +251,7 @@ if view == "detail":
             with btn_col1:
                 back_clicked = st.button("ZURÜCK ZUR ÜBERSICHT", key="btn_back", use_container_width=True)
             with btn_col2:
-                if d_id in st.session_state.watchlist:
+                if on_list:
                     list_clicked = st.button("VON LISTE ENTFERNEN", key="btn_list_remove", use_container_width=True)
                 else:
                     list_clicked = st.button("AUF DIE LISTE", key="btn_list_add", use_container_width=True)
@@ -425,20 +260,18 @@ if view == "detail":
 
             if back_clicked:
                 new_params = {"view": "home", "scroll": back_scroll}
-                for k in ["q", "genres", "providers", "sort", "true_story", "book"]:
+                for k in ["q", "genres", "providers", "sort", "true_story", "book", "page"]:
                     if qp.get(k):
                         new_params[k] = qp.get(k)
                 st.query_params.clear()
                 st.query_params.update(new_params)
                 st.rerun()
 
-            if d_id in st.session_state.watchlist and list_clicked:
-                st.session_state.watchlist.remove(d_id)
-                save_watchlist(st.session_state.watchlist)
+            if on_list and list_clicked:
+                watchlist_store.remove(user, d_id)
                 st.rerun()
-            elif d_id not in st.session_state.watchlist and list_clicked:
-                st.session_state.watchlist.append(d_id)
-                save_watchlist(st.session_state.watchlist)
+            elif not on_list and list_clicked:
+                watchlist_store.add(user, d_id)
                 st.rerun()
 
             st.markdown("<br>", unsafe_allow_html=True)
@@ -476,14 +309,34 @@ if view == "detail":
                     st.markdown("### Trailer")
                     st.video(f"https://www.youtube.com/watch?v={doc['trailer'][0]}")
 
+            # --- AEHNLICHE SERIEN (beim Indexieren vorberechnet, hier nur nachgeschlagen) ---
+            aehnliche = catalog.rows(catalog.similar(row)) if row >= 0 else []
+            if aehnliche:
+                st.markdown('<div class="genre-title">Ähnliche Serien</div>', unsafe_allow_html=True)
+                html = ['<div class="genre-row">']
+                for s in aehnliche:
+                    img = TMDB_PATH_SMALL + s["poster"] if s["poster"] else "https://via.placeholder.com/200x300"
+                    html.append(
+                        f"""<a class="card genre-card" href="?view=detail&id={s['id']}" target="_self">"""
+                        f"""<img src="{img}" loading="lazy">"""
+                        f"""<div class="t">{s['title']}</div>"""
+                        f"""<div class="meta">{s['rate']:.1f}</div></a>"""
+                    )
+                html.append("</div>")
+                st.markdown("".join(html), unsafe_allow_html=True)
+
 elif view == "mylist":
     st.markdown("## Meine Liste")
-    if not st.session_state.watchlist:
+    # Nur die IDs des Nutzers aus der Datenbank, die Karten per ID-Lookup im Katalog
+    wl_ids = watchlist_store.ids(user)
+    if not wl_ids:
         st.info("Du hast noch keine Serien auf deiner Liste.")
     else:
-        all_series = get_all_series()
-        wl_set = set(st.session_state.watchlist)
-        wl_series = [s for s in all_series if s["id"] in wl_set]
+        wl_rows = catalog.by_ids(wl_ids)
+        pages = max(-(-len(wl_rows) // query_builder.PAGE_SIZE), 1)
+        page = min(page_param, pages - 1)
+        start = page * query_builder.PAGE_SIZE
+        wl_series = catalog.rows(wl_rows[start:start + query_builder.PAGE_SIZE])
         html = ['<div class="grid">']
         for s in wl_series:
             img = TMDB_PATH_SMALL + s["poster"] if s["poster"] else "https://via.placeholder.com/200x300?text=No+Image"
@@ -494,36 +347,45 @@ elif view == "mylist":
                 f"""<div class="meta">{s['rate']:.1f}</div></a>"""
             )
         html.append("</div>")
+        html.append(pager(page, pages))
         st.markdown("".join(html), unsafe_allow_html=True)
 
 elif view == "grid":
     # --- Suchergebnisse-Ansicht (nach Filter) ---
-    all_series = get_all_series()
-
-    sel_genres = qp.get("genres", "").split(",") if qp.get("genres") else []
-    sel_provs = qp.get("providers", "").split(",") if qp.get("providers") else []
-    true_story = qp.get("true_story") == "1"
-    book = qp.get("book") == "1"
-    sort_k = qp.get("sort", "Beliebtheit")
-
-    results = filter_series(
-        all_series,
-        query=q_param,
-        genres=sel_genres if sel_genres else None,
-        providers=sel_provs if sel_provs else None,
-        true_story=true_story,
-        book=book,
-        sort_by=sort_k
-    )
+    # Gleiche Suchen (auch anders geschrieben oder sortiert) teilen sich einen Cache-Eintrag je Index-Stand
+    params = query_builder.canonical_params(qp)
+    sort_k = params.get("sort") or query_builder.default_sort(params.get("q"))
+    key = query_builder.cache_key(params)
+    cached = snapshot.results.get(key)
+    if cached is None:
+        # Suchtext (BM25), Filter, Sortierung und Seite laufen im Index; der Katalog liefert die Anzeige-Daten
+        # Woerter ohne jeden Treffer werden vorher per Tippfehler-Korrektur ersetzt
+        text = params.get("q", "")
+        corrected = query_builder.corrected_text(index, searcher, snapshot.spelling, text) if text else ""
+        if corrected:
+            text = corrected
+        query = query_builder.query_from_params(index, catalog, dict(params, q=text) if text else params)
+        max_hits = SEARCH_TOP_K if text else None
+        page_no = query_builder.page_param(params)
+        result = query_builder.search_page(index, searcher, catalog, query, sort_k, page_no, max_hits=max_hits)
+        hits = result.hits
+        snippets = query_builder.snippets(index, searcher, text, hits) if text else [""] * len(hits)
+        cached = (catalog.rows_for_hits(hits), snippets, result.page, result.pages, corrected)
+        snapshot.results.put(key, cached)
+    rows, snippets, page, pages, corrected = cached
+    results = catalog.rows(rows)
+
+    if corrected and results:
+        st.info(f"Ergebnisse für „{corrected}“ (statt „{q_param}“).")
 
     if not results:
         st.info("Keine Ergebnisse gefunden.")
     else:
         html = ['<div class="grid">']
-        for r in results:
+        for r, snippet in zip(results, snippets):
             img = TMDB_PATH_SMALL + r["poster"] if r["poster"] else "https://via.placeholder.com/200x300"
             href = f"?view=detail&id={r['id']}&q={up.quote(q_param, safe='')}"
-            for k in ["genres", "providers", "sort", "true_story", "book"]:
+            for k in ["genres", "providers", "sort", "true_story", "book", "page"]:
                 if qp.get(k):
                     href += f"&{k}={up.quote(qp.get(k), safe='')}"
 
@@ -532,17 +394,18 @@ elif view == "grid":
                 f"""<a class="card" href="{href}" target="_self">"""
                 f"""<img src="{img}" loading="lazy">"""
                 f"""<div class="t">{r['title']}</div>"""
-                f"""<div class="meta">{label}</div></a>"""
+                + (f"""<div class="snip">{snippet}</div>""" if snippet else "")
+                + f"""<div class="meta">{label}</div></a>"""
             )
         html.append("</div>")
         st.markdown("".join(html), unsafe_allow_html=True)
+    if pages > 1:
+        st.markdown(pager(page, pages), unsafe_allow_html=True)
 
 else:
-    # --- STARTSEITE: Genre-Kategorien mit je 15 Serien ---
-    all_series = get_all_series()
-
+    # --- STARTSEITE: Genre-Kategorien mit je 15 Serien (vorberechnet im Katalog) ---
     for kategorie in HOMEPAGE_KATEGORIEN:
-        serien = get_series_for_genre(all_series, kategorie, max_count=15)
+        serien = catalog.rows(catalog.rails.get(kategorie, []))
         if not serien:
             continue
 
@@ -0,0 +1,91 @@
+import re
+
+import numpy as np
+
+# "Aehnliche Serien": TF-IDF ueber Beschreibung, Handlung, Genres und Cast, je Serie die
+# K naechsten Nachbarn nach Kosinus. Laeuft beim Indexieren; die App liest nur die Liste.
+SIMILAR_K = 12
+# Terme in mehr als diesem Anteil der Serien unterscheiden nichts (und kosten am meisten)
+MAX_DF = 0.2
+# Zellen (Blockzeilen x Serien) einer Score-Matrix; begrenzt den Speicher pro Block
+BLOCK_CELLS = 1 << 22
+
+WORD = re.compile(r"[^\W\d_]{3,}")
+
+
+def features(description, overview, genres, actors):
+    """Terme einer Serie: Woerter aus Beschreibung und Handlung, Genres und Schauspieler als ganze Namen."""
+    words = WORD.findall(f"{description} {overview}".lower())
+    return words + [f"genre:{g.lower()}" for g in genres] + [f"actor:{a.lower()}" for a in actors]
+
+
+def tfidf(documents):
+    """Zeilennormierte TF-IDF-Matrix als CSR (indptr, indices, data); Terme aus nur einer Serie fallen weg."""
+    vocab = {}
+    lengths = []
+    terms = []
+    for words in documents:
+        terms.extend(vocab.setdefault(word, len(vocab)) for word in words)
+        lengths.append(len(words))
+    n = len(documents)
+    size = max(len(vocab), 1)
+    rows = np.repeat(np.arange(n, dtype=np.int64), lengths)
+
+    # Sortierte (Zeile, Term)-Paare mit Haeufigkeit -> bereits CSR-Reihenfolge
+    keys, counts = np.unique(rows * size + np.array(terms, dtype=np.int64), return_counts=True)
+    rows, cols = keys // size, keys % size
+    df = np.bincount(cols, minlength=size)
+    keep = (df[cols] > 1) & (df[cols] <= max(MAX_DF * n, 2))
+    rows, cols, counts = rows[keep], cols[keep], counts[keep]
+
+    data = (1.0 + np.log(counts)) * (np.log((1.0 + n) / (1.0 + df[cols])) + 1.0)
+    norms = np.sqrt(np.bincount(rows, weights=data ** 2, minlength=n))
+    data /= norms[rows]
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    return indptr, cols, data
+
+
+def neighbors(indptr, indices, data, k=SIMILAR_K):
+    """Je Zeile die k aehnlichsten Zeilen (Kosinus, absteigend; -1 = kein Nachbar).
+
+    Blockweises Produkt X_block @ X.T: jeder Term einer Blockzeile traegt ueber die
+    Postings des Terms (X transponiert) zu den Scores aller Serien bei.
+    """
+    n = len(indptr) - 1
+    result = np.full((n, k), -1, dtype=np.int64)
+    k = min(k, n - 1)
+    if k <= 0 or len(indices) == 0:
+        return result
+
+    # Transponiert (Term -> Serien) fuer die Postings
+    order = np.argsort(indices, kind="stable")
+    t_rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(indptr))[order]
+    t_data = data[order]
+    t_indptr = np.zeros(indices.max() + 2, dtype=np.int64)
+    np.cumsum(np.bincount(indices, minlength=len(t_indptr) - 1), out=t_indptr[1:])
+
+    block = max(1, BLOCK_CELLS // n)
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        lo, hi = indptr[start], indptr[stop]
+        b_rows = np.repeat(np.arange(stop - start), np.diff(indptr[start:stop + 1]))
+        b_terms = indices[lo:hi]
+        lengths = t_indptr[b_terms + 1] - t_indptr[b_terms]
+        # Positionen aller Postings der Block-Terme hintereinander
+        pos = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths - t_indptr[b_terms], lengths)
+        scores = np.bincount(
+            np.repeat(b_rows, lengths) * n + t_rows[pos],
+            weights=np.repeat(data[lo:hi], lengths) * t_data[pos],
+            minlength=(stop - start) * n,
+        ).reshape(stop - start, n)
+        scores[np.arange(stop - start), np.arange(start, stop)] = 0.0
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        # Absteigend nach Score, bei Gleichstand die fruehere Zeile
+        order = np.lexsort((top, -top_scores), axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        result[start:stop, :k] = np.where(top_scores > 0, top, -1)
+    return result
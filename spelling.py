@@ -0,0 +1,104 @@
+from collections import Counter
+
+from suggest import normalize
+
+# Erlaubte Tippfehler je Wortlaenge (kurze Woerter nur exakt, sonst waere fast alles ein Treffer)
+MAX_DISTANCE = [(8, 2), (4, 1)]
+# Loeschvarianten nur ueber die ersten Zeichen bilden (wie SymSpell); haelt das Woerterbuch klein
+PREFIX_LENGTH = 7
+
+
+def max_distance(word):
+    for length, distance in MAX_DISTANCE:
+        if len(word) >= length:
+            return distance
+    return 0
+
+
+def reach(word):
+    """Groesster Abstand, mit dem ein (laengeres) Suchwort dieses Woerterbuch-Wort noch treffen darf."""
+    return max([distance for length, distance in MAX_DISTANCE if len(word) + distance >= length], default=0)
+
+
+def deletes(word, distance):
+    """Alle Varianten mit bis zu `distance` geloeschten Zeichen (inkl. des Wortes selbst)."""
+    result = {word}
+    edge = {word}
+    for _ in range(distance):
+        edge = {w[:i] + w[i + 1:] for w in edge for i in range(len(w))} - result
+        result |= edge
+    return result
+
+
+def edit_distance(a, b, limit):
+    """Damerau-Levenshtein (Vertauschung zaehlt 1); bricht ab, sobald `limit` ueberschritten ist."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class SpellIndex:
+    """Tippfehler-Korrektur mit vorberechnetem Loesch-Woerterbuch (SymSpell) ueber Titel- und Cast-Woerter.
+
+    Zur Laufzeit werden nur die Loeschvarianten des Suchworts nachgeschlagen und
+    die wenigen Kandidaten exakt geprueft, nie alle Titel. Bei gleichem Abstand gewinnt
+    das Wort, das mit den uebrigen Suchwoertern in denselben Serien vorkommt
+    ("stranger thigs" -> "things", nicht das haeufigere "this"). Wird einmal pro Index-Stand gebaut.
+    """
+
+    def __init__(self, documents):
+        # documents: Woerter je Serie (Titel + Cast)
+        self.counts = Counter(word for words in documents for word in words)
+        self.rows = {}
+        for row, words in enumerate(documents):
+            for word in set(words):
+                self.rows.setdefault(word, set()).add(row)
+        self.variants = {}
+        for word in self.counts:
+            for variant in deletes(word[:PREFIX_LENGTH], reach(word)):
+                self.variants.setdefault(variant, []).append(word)
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        return cls([
+            normalize(catalog.title[row]).split() + normalize(catalog.actors[row].replace("\n", " ")).split()
+            for row in range(len(catalog))
+        ])
+
+    def correct_word(self, word, context=frozenset()):
+        """Bekanntes Wort unveraendert, sonst das naechste Wort (Kontext, dann Haeufigkeit) oder das Wort selbst.
+
+        context: Serien (Zeilen), in denen die uebrigen Suchwoerter vorkommen.
+        """
+        distance = max_distance(word)
+        if word in self.counts or distance == 0 or word.isdigit():
+            return word
+        candidates = set()
+        for variant in deletes(word[:PREFIX_LENGTH], distance):
+            candidates.update(self.variants.get(variant, ()))
+        best = None
+        for candidate in candidates:
+            found = edit_distance(word, candidate, distance)
+            if found <= distance:
+                key = (found, -len(self.rows[candidate] & context), -self.counts[candidate], candidate)
+                best = min(best, key) if best else key
+        return best[-1] if best else word
+
+    def context(self, words):
+        """Serien (Zeilen), in denen mindestens eines der (normalisierten) Woerter vorkommt."""
+        rows = set()
+        for word in words:
+            rows |= self.rows.get(word, set())
+        return rows
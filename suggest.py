@@ -0,0 +1,97 @@
+import re
+import unicodedata
+
+import numpy as np
+
+# Vorschlaege pro Tastendruck; Praefixe bis zu dieser Laenge sind vorberechnet
+SUGGEST_LIMIT = 8
+SHORT_PREFIX = 2
+# Kein Schluessel ist groesser als "praefix" + dieses Zeichen
+MAX_CHAR = "\U0010ffff"
+
+WORD = re.compile(r"\w+")
+# "Doctor’s Diary" soll auch unter "doctors" gefunden werden
+APOSTROPHE = re.compile(r"['’`´]")
+
+
+def normalize(text):
+    """Kleinbuchstaben ohne Akzente und Satzzeichen ("Amélie: Teil 2" -> "amelie teil 2")."""
+    text = unicodedata.normalize("NFKD", APOSTROPHE.sub("", text.lower()))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(WORD.findall(text))
+
+
+class PrefixIndex:
+    """Suchvorschlaege fuer Titel und Schauspieler: sortierte Schluessel mit Binaersuche.
+
+    Jeder Wortanfang eines Namens ist ein Schluessel ("bad" findet "Breaking Bad").
+    Ranking nach tmdb_popularity (Schauspieler: ihre populaerste Serie). Wird einmal
+    pro Index-Stand aus dem Katalog gebaut.
+    """
+
+    def __init__(self, labels, kinds, targets, scores):
+        self.labels = labels
+        self.kinds = kinds
+        self.targets = targets
+        self.scores = np.asarray(scores, dtype=np.float64)
+
+        keys = []
+        owners = []
+        for i, label in enumerate(labels):
+            words = normalize(label).split()
+            for j in range(len(words)):
+                keys.append(" ".join(words[j:]))
+                owners.append(i)
+        keys = np.array(keys, dtype=str)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.owners = np.array(owners, dtype=np.int64)[order]
+
+        # Kurze Praefixe treffen viele Schluessel; deren Top-k einmal vorab bestimmen
+        self.short = {}
+        for length in range(1, SHORT_PREFIX + 1):
+            for prefix in {key[:length] for key in self.keys if len(key) >= length}:
+                self.short[prefix] = self.rank(prefix)
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        labels, kinds, targets, scores = [], [], [], []
+        for row in range(len(catalog)):
+            labels.append(catalog.title[row])
+            kinds.append("title")
+            targets.append(int(catalog.id[row]))
+            scores.append(float(catalog.pop[row]))
+
+        actors = {}
+        for row in range(len(catalog)):
+            for name in filter(None, catalog.actors[row].split("\n")):
+                actors[name] = max(actors.get(name, 0.0), float(catalog.pop[row]))
+        for name, score in actors.items():
+            labels.append(name)
+            kinds.append("actor")
+            targets.append(name)
+            scores.append(score)
+        return cls(labels, kinds, targets, scores)
+
+    def rank(self, prefix, k=SUGGEST_LIMIT):
+        """Bis zu k Eintraege (Nummern) zum normalisierten Praefix, populaerste zuerst."""
+        lo = np.searchsorted(self.keys, prefix, side="left")
+        hi = np.searchsorted(self.keys, prefix + MAX_CHAR, side="left")
+        owners = np.unique(self.owners[lo:hi])
+        if len(owners) > k:
+            owners = owners[np.argpartition(-self.scores[owners], k - 1)[:k]]
+        # Gleiche Popularitaet: Titel vor Schauspielern, sonst Einfuegereihenfolge
+        return owners[np.lexsort((owners, -self.scores[owners]))].tolist()
+
+    def lookup(self, text, k=SUGGEST_LIMIT):
+        """Vorschlaege fuer die Eingabe: [{"label", "kind", "target"}], kind "title" (Serien-ID) oder "actor"."""
+        prefix = normalize(text)
+        if not prefix:
+            return []
+        found = self.short.get(prefix) if len(prefix) <= SHORT_PREFIX else None
+        if found is None:
+            found = self.rank(prefix, k)
+        return [
+            {"label": self.labels[i], "kind": self.kinds[i], "target": self.targets[i]}
+            for i in found[:k]
+        ]
@@ -0,0 +1,72 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Tag-Woerterbuch: Indexfeld -> Stichwoerter (kleingeschrieben, Teilstring-Treffer wie frueher check_keywords).
+# Neue Flags hier eintragen; indexing.py legt fuer jedes Feld ein Integer-Feld (0/1) an.
+TAGS = {
+    "is_based_on_book": ["buch", "roman", "novel", "book", "basiert auf"],
+    "is_true_story": ["wahre begebenheit", "true story", "biografie", "biography"],
+    "is_anime_adaptation": ["manga", "light novel", "anime-adaption", "anime adaptation"],
+    "is_miniseries": ["miniserie", "mini-serie", "miniseries", "mini-series", "limited series", "vierteiler", "dreiteiler"],
+    "is_remake": ["remake", "neuverfilmung", "neuauflage", "reboot"],
+    "is_spin_off": ["spin-off", "spinoff", "spin off", "ableger"],
+}
+
+
+def trie_pattern(words):
+    """Stichwoerter als Praefixbaum-Regex: jede Textstelle wird nur einmal pro Anfangsbuchstabe geprueft.
+
+    findall liefert je Stelle den laengsten Treffer (Gruppe 1), auch ueberlappende.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def to_regex(node):
+        alternatives = [re.escape(ch) + to_regex(child) for ch, child in sorted(node.items()) if ch]
+        if not alternatives:
+            return ""
+        optional = "" in node
+        if len(alternatives) == 1 and not optional:
+            return alternatives[0]
+        # Greedy "?" bevorzugt das laengere Stichwort
+        return "(?:" + "|".join(alternatives) + ")" + ("?" if optional else "")
+
+    # Lookahead: an jeder Textstelle pruefen, auch innerhalb eines frueheren Treffers
+    # ("romanga" -> "roman" und "manga"), wie ein Teilstring-Test je Stichwort
+    return re.compile("(?=(" + to_regex(trie) + "))")
+
+
+def compile_tags(tags=TAGS):
+    """Ein Muster fuer alle Stichwoerter plus Zuordnung Treffer -> Felder.
+
+    Pro Stelle zaehlt nur der laengste Treffer; enthaelt ein Stichwort ein
+    anderes (z.B. "light novel" / "novel"), erbt es dessen Felder.
+    """
+    keywords = {k for words in tags.values() for k in words}
+    fields_for = {
+        k: [field for field, words in tags.items() if any(w in k for w in words)]
+        for k in keywords
+    }
+    return trie_pattern(keywords), fields_for
+
+
+PATTERN, FIELDS_FOR = compile_tags()
+
+
+def extract(texts, tags=TAGS):
+    """Alle Flags in einem Durchlauf pro Text; liefert {feld: int-Array} fuer die ganze Spalte."""
+    pattern, fields_for = (PATTERN, FIELDS_FOR) if tags is TAGS else compile_tags(tags)
+    texts = pd.Series(texts).fillna("").str.lower()
+
+    flags = {field: np.zeros(len(texts), dtype=np.int64) for field in tags}
+    for row, found in enumerate(texts.str.findall(pattern)):
+        for keyword in found:
+            for field in fields_for[keyword]:
+                flags[field][row] = 1
+    return flags
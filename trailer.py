@@ -1,22 +1,20 @@
-import json
+import pyarrow as pa
+import pyarrow.compute as pc
 
 
-def get_key(response_text: str, platform: str = "youtube", allowed_langs: list[str] = ["de", "en"]) -> str:
-    try:
-        data = json.loads(response_text)
-        print(data)
-    except (ValueError, json.JSONDecodeError):
-        data = {}
+def get_keys(results: pa.ListArray, platform: str = "youtube", allowed_langs: list[str] = ["de", "en"]) -> list:
+    """Trailer-Key je Zeile einer Arrow-Spalte von TMDB-Videolisten (list<struct>); Sprachen in Reihenfolge von allowed_langs."""
+    flat = pc.list_flatten(results)
+    parents = pc.list_parent_indices(results)
+    rank = pc.index_in(pc.utf8_lower(pc.struct_field(flat, "iso_639_1")), value_set=pa.array(allowed_langs))
+    mask = pc.and_(pc.equal(pc.utf8_lower(pc.struct_field(flat, "site")), platform),
+                   pc.equal(pc.utf8_lower(pc.struct_field(flat, "type")), "trailer"))
+    mask = pc.fill_null(pc.and_(mask, pc.is_valid(rank)), False)
 
-    trailers = [
-        v for v in data.get("results", [])
-        if isinstance(v, dict)
-        and v.get("site", "").lower() == platform
-        and v.get("type", "").lower() == "trailer"
-        and v.get("iso_639_1", "").lower() in allowed_langs
-    ]
-
-    key = None
-    if trailers and isinstance(trailers[0], dict):
-        key = trailers[0].get("key")
-    return key
\ No newline at end of file
+    # Pro Zeile der erste Trailer mit der besten Sprache (deutscher vor englischem Trailer)
+    best = {}
+    for row, r, key in zip(pc.filter(parents, mask).to_pylist(), pc.filter(rank, mask).to_pylist(),
+                           pc.filter(pc.struct_field(flat, "key"), mask).to_pylist()):
+        if row not in best or r < best[row][0]:
+            best[row] = (r, key)
+    return [best[row][1] if row in best else None for row in range(len(results))]
@@ -0,0 +1,112 @@
+import urllib.parse as up
+
+import streamlit as st
+import streamlit.components.v2 as components
+
+# Suchfeld mit Vorschlaegen: jede Eingabe (entprellt) laeuft als Komponenten-State
+# zurueck nach Python, der Praefix-Index des aktuellen Index-Stands liefert die Liste.
+DEBOUNCE_MS = 120
+
+HTML = """
+<label class="ta-label"></label>
+<input class="ta-input" type="text" autocomplete="off">
+<ul class="ta-list"></ul>
+"""
+
+CSS = """
+.ta-label { display: block; font-size: 0.875rem; margin-bottom: 6px; }
+.ta-input {
+    width: 100%; box-sizing: border-box; padding: 10px 12px; border-radius: 6px;
+    border: 1px solid rgba(255, 255, 255, 0.2); background: rgba(255, 255, 255, 0.05);
+    color: white; font-size: 1rem; outline: none;
+}
+.ta-input:focus { border-color: var(--main-color, #00e5ff); }
+.ta-list { list-style: none; margin: 4px 0 0; padding: 0; }
+.ta-list a {
+    display: flex; justify-content: space-between; padding: 6px 12px;
+    color: white; text-decoration: none; border-radius: 4px;
+}
+.ta-list a:hover { background: rgba(0, 229, 255, 0.15); }
+.ta-kind { color: #999; font-size: 0.75rem; }
+"""
+
+JS = """
+export default function(component) {
+    const { data, setStateValue, parentElement } = component;
+    const label = parentElement.querySelector(".ta-label");
+    const input = parentElement.querySelector(".ta-input");
+    const list = parentElement.querySelector(".ta-list");
+
+    label.textContent = data.label;
+    input.placeholder = data.placeholder;
+    // Waehrend getippt wird, nie den Text ueberschreiben (Antwort kann aelter sein)
+    if (!input.matches(":focus") && input.value !== data.text) {
+        input.value = data.text;
+    }
+
+    list.replaceChildren();
+    if (input.value === data.text) {
+        for (const s of data.suggestions) {
+            const a = document.createElement("a");
+            a.href = s.href;
+            a.target = "_self";
+            const title = document.createElement("span");
+            title.textContent = s.label;
+            const kind = document.createElement("span");
+            kind.className = "ta-kind";
+            kind.textContent = s.kind;
+            a.append(title, kind);
+            const li = document.createElement("li");
+            li.append(a);
+            list.append(li);
+        }
+    }
+
+    let timer;
+    input.oninput = () => {
+        clearTimeout(timer);
+        timer = setTimeout(() => setStateValue("text", input.value), data.debounce);
+    };
+    input.onblur = () => setStateValue("text", input.value);
+    input.onkeydown = (e) => {
+        if (e.key === "Enter") {
+            // Filter und Sortierung der aktuellen Suche bleiben erhalten
+            const params = new URLSearchParams(data.params);
+            params.set("view", "grid");
+            params.set("q", input.value);
+            window.location.href = "?" + params.toString();
+        }
+    };
+}
+"""
+
+_typeahead = components.component("typeahead", html=HTML, css=CSS, js=JS)
+
+KIND_LABELS = {"title": "Serie", "actor": "Cast"}
+
+
+def suggestion_href(suggestion):
+    """Serie -> Detailseite, Schauspieler -> Suche nach dem Namen."""
+    if suggestion["kind"] == "title":
+        return f"?view=detail&id={suggestion['target']}"
+    return "?" + up.urlencode({"view": "grid", "q": suggestion["target"]})
+
+
+def typeahead(label, value, prefix_index, key, placeholder="", params=None):
+    """Textfeld mit Live-Vorschlaegen aus einem suggest.PrefixIndex; liefert den aktuellen Text.
+
+    params: URL-Parameter, die Enter zusaetzlich zum Suchtext in die Grid-URL uebernimmt.
+    """
+    text = (st.session_state.get(key) or {}).get("text", value)
+    suggestions = [
+        {"label": s["label"], "kind": KIND_LABELS[s["kind"]], "href": suggestion_href(s)}
+        for s in prefix_index.lookup(text)
+    ]
+    result = _typeahead(
+        key=key,
+        data={"label": label, "text": text, "placeholder": placeholder,
+              "suggestions": suggestions, "debounce": DEBOUNCE_MS, "params": params or {}},
+        default={"text": value},
+        on_text_change=lambda: None,
+    )
+    return result.text
@@ -0,0 +1,55 @@
+import sqlite3
+import threading
+import time
+
+
+class WatchlistStore:
+    """Merklisten aller Nutzer in SQLite (WAL); Hinzufuegen/Entfernen ist je eine Zeile in einer Transaktion.
+
+    Parallele Sitzungen ueberschreiben sich nicht mehr gegenseitig wie beim frueheren watchlist.json.
+    """
+
+    def __init__(self, path="watchlist.sqlite"):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS watchlist (
+                user TEXT NOT NULL,
+                series_id INTEGER NOT NULL,
+                added REAL NOT NULL,
+                PRIMARY KEY (user, series_id)
+            ) WITHOUT ROWID""")
+        self.db.commit()
+
+    def ids(self, user):
+        """Serien-IDs eines Nutzers in der Reihenfolge, in der sie hinzugefuegt wurden."""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT series_id FROM watchlist WHERE user = ? ORDER BY added", (user,)).fetchall()
+        return [row[0] for row in rows]
+
+    def count(self, user):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM watchlist WHERE user = ?", (user,)).fetchone()[0]
+
+    def contains(self, user, series_id):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT 1 FROM watchlist WHERE user = ? AND series_id = ?", (user, series_id)).fetchone()
+        return row is not None
+
+    def add(self, user, series_id):
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR IGNORE INTO watchlist (user, series_id, added) VALUES (?, ?, ?)",
+                (user, series_id, time.time()))
+
+    def remove(self, user, series_id):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM watchlist WHERE user = ? AND series_id = ?", (user, series_id))
+
+    def close(self):
+        with self.lock:
+            self.db.close()